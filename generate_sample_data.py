@@ -5,62 +5,105 @@ Generates realistic test data for CIS and GSTR-2B files
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import random
+import xlsxwriter
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Seed used when create_sample_data is not given one, for reproducibility
+DEFAULT_SEED = 42
 
-def generate_gstin():
-    """Generate a realistic-looking GSTIN"""
-    state_codes = ['01', '09', '19', '24', '27', '29', '33', '36']
-    state = random.choice(state_codes)
-    pan = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=5))
-    pan += ''.join(random.choices('0123456789', k=4))
-    pan += random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-    entity = random.choice('123456789')
-    check = random.choice('Z123456789')
-    return f"{state}{pan}{entity}{check}"
+# Characters used when rewriting the last 5 characters of a GSTIN
+GSTIN_SUFFIX_CHARS = np.frombuffer(b'123456789Z', dtype='S1')
 
-def generate_invoice_number(prefix_style='mixed'):
-    """Generate various invoice number formats"""
+GSTIN_STATE_CODES = np.array(['01', '09', '19', '24', '27', '29', '33', '36'], dtype='S2')
+ALPHA_CHARS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DIGIT_CHARS = b'0123456789'
+# Alphabet for each GSTIN character after the state code:
+# PAN (5 letters, 4 digits, 1 letter), entity code, check character
+GSTIN_ALPHABETS = [ALPHA_CHARS] * 5 + [DIGIT_CHARS] * 4 + [ALPHA_CHARS, b'123456789', b'Z123456789']
+GSTIN_CHAR_TABLE = np.array([list(a.ljust(26)) for a in GSTIN_ALPHABETS], dtype=np.uint8)
+GSTIN_ALPHABET_SIZES = np.array([len(a) for a in GSTIN_ALPHABETS])
+
+def generate_gstins(n, rng):
+    """Generate n realistic-looking GSTINs in one vectorized draw"""
+    state = GSTIN_STATE_CODES[rng.integers(0, len(GSTIN_STATE_CODES), size=n)]
+    picks = (rng.random((n, len(GSTIN_ALPHABETS))) * GSTIN_ALPHABET_SIZES).astype(np.intp)
+    chars = GSTIN_CHAR_TABLE[np.arange(len(GSTIN_ALPHABETS)), picks]
+    rest = np.ascontiguousarray(chars).view(f'S{len(GSTIN_ALPHABETS)}').ravel()
+    return np.char.add(state, rest).astype(str)
+
+def generate_invoice_number(py_rng, prefix_style='mixed'):
+    """Generate various invoice number formats (py_rng: a random.Random)"""
     if prefix_style == 'numeric':
-        return str(random.randint(1000, 9999))
+        return str(py_rng.randint(1000, 9999))
     elif prefix_style == 'alpha':
-        return f"INV-{random.randint(100, 999)}"
+        return f"INV-{py_rng.randint(100, 999)}"
     elif prefix_style == 'state':
         states = ['WB', 'MH', 'DL', 'TN', 'KA']
-        return f"{random.choice(states)}-{random.randint(1000, 9999)}"
+        return f"{py_rng.choice(states)}-{py_rng.randint(1000, 9999)}"
     else:  # mixed
         styles = ['numeric', 'alpha', 'state']
-        return generate_invoice_number(random.choice(styles))
+        return generate_invoice_number(py_rng, py_rng.choice(styles))
+
+def generate_dates(start_date, end_date, n, rng):
+    """Generate n random dates between start and end as dd/mm/yyyy strings"""
+    days_between = (end_date - start_date).days
+    start64 = np.datetime64(start_date.date(), 'D')
+    dates = start64 + rng.integers(0, days_between + 1, size=n, dtype='i4')
+    return pd.to_datetime(dates).strftime('%d/%m/%Y').to_numpy(dtype=object)
 
-def generate_date(start_date, end_date):
-    """Generate random date between start and end"""
-    time_between = end_date - start_date
-    days_between = time_between.days
-    random_days = random.randint(0, days_between)
-    return start_date + timedelta(days=random_days)
+def introduce_digit_typos(num_parts, rng):
+    """
+    Introduce a single digit typo (+1 or +2, mod 10) into each numeric string.
+    Works on the ASCII bytes of the whole batch at once.
+    """
+    if len(num_parts) == 0:
+        return num_parts
+    buf = num_parts.astype('S').view(np.uint8).reshape(len(num_parts), -1).copy()
+    rows = np.arange(len(num_parts))
+    pos = (rng.random(len(num_parts)) * np.char.str_len(num_parts)).astype(np.intp)
+    delta = rng.integers(1, 3, size=len(num_parts))
+    buf[rows, pos] = ord('0') + (buf[rows, pos] - ord('0') + delta) % 10
+    return buf.view(f'S{buf.shape[1]}').ravel().astype(str)
 
-def generate_amount():
-    """Generate realistic invoice amounts"""
+def generate_amounts(n, rng):
+    """Generate n realistic invoice amounts in one vectorized draw"""
     # Most invoices are small, some are large
-    if random.random() < 0.7:
-        return round(random.uniform(5000, 50000), 2)
-    elif random.random() < 0.9:
-        return round(random.uniform(50000, 200000), 2)
-    else:
-        return round(random.uniform(200000, 1000000), 2)
+    small = rng.uniform(5000, 50000, n)
+    medium = rng.uniform(50000, 200000, n)
+    large = rng.uniform(200000, 1000000, n)
+    amounts = np.where(rng.random(n) < 0.7, small,
+                       np.where(rng.random(n) < 0.9, medium, large))
+    return amounts.round(2)
 
-def create_sample_data(num_records=100, mismatch_rate=0.15):
+def generate_tax_block(n, rng, only_igst=False):
+    """
+    Draw n taxable values with a random GST rate and tax type
+    (IGST or CGST+SGST). Returns (taxable, igst, cgst, sgst) arrays.
+    """
+    taxable = generate_amounts(n, rng)
+    tax_rate = rng.choice([5, 12, 18, 28], size=n)
+    is_igst = np.ones(n, dtype=bool) if only_igst else rng.random(n) < 0.5
+    igst = np.where(is_igst, (taxable * tax_rate / 100).round(2), 0.0)
+    cgst = np.where(is_igst, 0.0, (taxable * tax_rate / 200).round(2))
+    return taxable, igst, cgst, cgst.copy()
+
+def create_sample_data(num_records=100, mismatch_rate=0.15, seed=None):
     """
     Create sample CIS and GSTR-2B data
     
     Parameters:
     - num_records: Number of records to generate
     - mismatch_rate: Percentage of records that should be mismatches (0-1)
+    - seed: Optional seed (DEFAULT_SEED when omitted); each call draws from
+      its own generators, so a dataset built in a worker process is
+      reproducible on its own
     """
+    if seed is None:
+        seed = DEFAULT_SEED
+    rng = np.random.default_rng(seed)
+    py_rng = random.Random(seed)
     
     print(f"Generating {num_records} sample records...")
     
@@ -71,198 +114,146 @@ def create_sample_data(num_records=100, mismatch_rate=0.15):
     # Generate supplier GSTINs (10-20 unique suppliers)
     num_suppliers = min(20, max(10, num_records // 5))
     suppliers = {
-        generate_gstin(): f"Supplier_{i+1}" 
-        for i in range(num_suppliers)
+        gstin: f"Supplier_{i+1}"
+        for i, gstin in enumerate(generate_gstins(num_suppliers, rng))
     }
-    
-    cis_records = []
-    g2b_records = []
+    supplier_keys = np.array(list(suppliers.keys()), dtype=object)
     
     matched_records = int(num_records * (1 - mismatch_rate))
-    
-    # Generate matched records
-    for i in range(matched_records):
-        gstin = random.choice(list(suppliers.keys()))
-        invoice_num = generate_invoice_number()
-        invoice_date = generate_date(start_date, end_date)
-        taxable_value = generate_amount()
-        
-        # Randomly choose tax type (IGST or CGST+SGST)
-        if random.random() < 0.5:
-            # IGST (interstate)
-            tax_rate = random.choice([5, 12, 18, 28])
-            igst = round(taxable_value * tax_rate / 100, 2)
-            cgst = 0
-            sgst = 0
-        else:
-            # CGST + SGST (intrastate)
-            tax_rate = random.choice([5, 12, 18, 28])
-            igst = 0
-            cgst = round(taxable_value * tax_rate / 200, 2)
-            sgst = round(taxable_value * tax_rate / 200, 2)
-        
-        # Add variation for different layer testing
-        variation_type = random.random()
-        
-        if variation_type < 0.6:
-            # Layer 1 & 2: Exact match
-            cis_inv = invoice_num
-            g2b_inv = invoice_num
-            g2b_taxable = taxable_value
-            g2b_igst, g2b_cgst, g2b_sgst = igst, cgst, sgst
-            
-        elif variation_type < 0.7:
-            # Layer 3: Small amount difference
-            cis_inv = invoice_num
-            g2b_inv = invoice_num
-            g2b_taxable = taxable_value + round(random.uniform(-30, 30), 2)
-            g2b_igst, g2b_cgst, g2b_sgst = igst, cgst, sgst
-            
-        elif variation_type < 0.8:
-            # Layer 4: Numeric only
-            prefix = random.choice(['INV/', 'GST/', 'BIL/'])
-            cis_inv = f"{prefix}{invoice_num}"
-            g2b_inv = invoice_num
-            g2b_taxable = taxable_value
-            g2b_igst, g2b_cgst, g2b_sgst = igst, cgst, sgst
-            
-        elif variation_type < 0.9:
-            # Layer 7: Fuzzy match (typo)
-            num_part = ''.join(filter(str.isdigit, invoice_num))
-            if num_part and len(num_part) >= 4:
-                # Introduce single digit typo
-                num_list = list(num_part)
-                idx = random.randint(0, len(num_list)-1)
-                num_list[idx] = str((int(num_list[idx]) + random.randint(1, 2)) % 10)
-                typo_num = ''.join(num_list)
-                cis_inv = invoice_num
-                g2b_inv = typo_num if random.random() < 0.5 else f"INV-{typo_num}"
-            else:
-                cis_inv = invoice_num
-                g2b_inv = invoice_num
-            g2b_taxable = taxable_value
-            g2b_igst, g2b_cgst, g2b_sgst = igst, cgst, sgst
-            
-        else:
-            # Layer 6: PAN level (different GSTIN, same PAN)
-            cis_inv = invoice_num
-            g2b_inv = invoice_num
-            # Change last 5 characters of GSTIN
-            pan = gstin[:10]
-            gstin = f"{pan}{''.join(random.choices('123456789Z', k=5))}"
-            g2b_taxable = taxable_value
-            g2b_igst, g2b_cgst, g2b_sgst = igst, cgst, sgst
-        
-        # CIS Record
-        cis_records.append({
-            'SupplierGSTIN': gstin,
-            'DocumentNumber': cis_inv,
-            'DocumentDate': invoice_date.strftime('%d/%m/%Y'),
-            'TaxableValue': taxable_value,
-            'IntegratedTaxAmount': igst,
-            'CentralTaxAmount': cgst,
-            'StateUT TaxAmount': sgst,
-            'SupplierName': suppliers.get(gstin[:10] + '00000', 'Unknown')[:gstin[:10]]
-        })
-        
-        # GSTR-2B Record
-        g2b_records.append({
-            'GSTIN of supplier': gstin,
-            'Invoice number': g2b_inv,
-            'Invoice Date': invoice_date.strftime('%d/%m/%Y'),
-            'Taxable Value (₹)': g2b_taxable,
-            'Integrated Tax(₹)': g2b_igst,
-            'Central Tax(₹)': g2b_cgst,
-            'State/UT Tax(₹)': g2b_sgst
-        })
-    
-    # Generate unmatched records (only in CIS)
     unmatched_records = num_records - matched_records
-    for i in range(unmatched_records):
-        gstin = random.choice(list(suppliers.keys()))
-        invoice_num = generate_invoice_number()
-        invoice_date = generate_date(start_date, end_date)
-        taxable_value = generate_amount()
-        
-        # Randomly choose tax type
-        if random.random() < 0.5:
-            tax_rate = random.choice([5, 12, 18, 28])
-            igst = round(taxable_value * tax_rate / 100, 2)
-            cgst = 0
-            sgst = 0
-        else:
-            tax_rate = random.choice([5, 12, 18, 28])
-            igst = 0
-            cgst = round(taxable_value * tax_rate / 200, 2)
-            sgst = round(taxable_value * tax_rate / 200, 2)
-        
-        cis_records.append({
-            'SupplierGSTIN': gstin,
-            'DocumentNumber': invoice_num,
-            'DocumentDate': invoice_date.strftime('%d/%m/%Y'),
-            'TaxableValue': taxable_value,
-            'IntegratedTaxAmount': igst,
-            'CentralTaxAmount': cgst,
-            'StateUT TaxAmount': sgst,
-            'SupplierName': suppliers.get(gstin[:10] + '00000', 'Unknown')[:gstin[:10]]
-        })
+    num_time_barred = max(2, int(num_records * 0.05))
     
     # Add some reverse clubbing scenarios (Layer 8)
-    # Take 5% of matched records and split them in G2B
+    # Take 5% of matched records and split them into 2-3 records in G2B
     num_split = max(2, int(matched_records * 0.05))
-    for i in range(num_split):
-        base_record = random.choice(g2b_records[:matched_records])
-        
-        # Split into 2-3 records
-        num_splits = random.randint(2, 3)
-        split_amount = base_record['Taxable Value (₹)'] / num_splits
-        split_igst = base_record['Integrated Tax(₹)'] / num_splits
-        split_cgst = base_record['Central Tax(₹)'] / num_splits
-        split_sgst = base_record['State/UT Tax(₹)'] / num_splits
-        
-        for j in range(num_splits - 1):
-            g2b_records.append({
-                'GSTIN of supplier': base_record['GSTIN of supplier'],
-                'Invoice number': base_record['Invoice number'],
-                'Invoice Date': base_record['Invoice Date'],
-                'Taxable Value (₹)': round(split_amount, 2),
-                'Integrated Tax(₹)': round(split_igst, 2),
-                'Central Tax(₹)': round(split_cgst, 2),
-                'State/UT Tax(₹)': round(split_sgst, 2)
-            })
+    base_idx = rng.integers(0, matched_records, size=num_split)
+    num_splits = rng.integers(2, 4, size=num_split)
+    split_idx = np.repeat(base_idx, num_splits - 1)
+    split_div = np.repeat(num_splits, num_splits - 1)
+    
+    # Preallocate one typed array per output column:
+    # CIS = matched + unmatched + time-barred, G2B = matched + split rows
+    total_cis = matched_records + unmatched_records + num_time_barred
+    cis_gstin = np.empty(total_cis, dtype=object)
+    cis_inv = np.empty(total_cis, dtype=object)
+    cis_date = np.empty(total_cis, dtype=object)
+    cis_taxable = np.empty(total_cis, dtype=np.float64)
+    cis_igst = np.zeros(total_cis, dtype=np.float64)
+    cis_cgst = np.zeros(total_cis, dtype=np.float64)
+    cis_sgst = np.zeros(total_cis, dtype=np.float64)
+    
+    total_g2b = matched_records + len(split_idx)
+    g2b_gstin = np.empty(total_g2b, dtype=object)
+    g2b_inv = np.empty(total_g2b, dtype=object)
+    g2b_date = np.empty(total_g2b, dtype=object)
+    g2b_taxable = np.empty(total_g2b, dtype=np.float64)
+    g2b_igst = np.empty(total_g2b, dtype=np.float64)
+    g2b_cgst = np.empty(total_g2b, dtype=np.float64)
+    g2b_sgst = np.empty(total_g2b, dtype=np.float64)
+    
+    # Generate matched records
+    m = matched_records
+    cis_gstin[:m] = supplier_keys[rng.integers(0, len(supplier_keys), size=m)]
+    cis_taxable[:m], cis_igst[:m], cis_cgst[:m], cis_sgst[:m] = generate_tax_block(m, rng)
+    
+    # Add variation for different layer testing
+    variation_type = rng.random(m)
+    
+    # Layer 3: Small amount difference
+    g2b_taxable[:m] = cis_taxable[:m]
+    small_diff = (variation_type >= 0.6) & (variation_type < 0.7)
+    g2b_taxable[:m][small_diff] += rng.uniform(-30, 30, small_diff.sum()).round(2)
+    g2b_igst[:m] = cis_igst[:m]
+    g2b_cgst[:m] = cis_cgst[:m]
+    g2b_sgst[:m] = cis_sgst[:m]
+    
+    for i in range(m):
+        cis_inv[i] = generate_invoice_number(py_rng)
+    cis_date[:m] = generate_dates(start_date, end_date, m, rng)
+    g2b_inv[:m] = cis_inv[:m]
+    
+    # Layer 4: Numeric only
+    numeric_only = np.flatnonzero((variation_type >= 0.7) & (variation_type < 0.8))
+    prefixes = rng.choice(['INV/', 'GST/', 'BIL/'], size=len(numeric_only))
+    cis_inv[numeric_only] = np.char.add(prefixes, cis_inv[numeric_only].astype(str))
+    
+    # Layer 7: Fuzzy match (typo) on invoices with 4+ digits
+    fuzzy = np.flatnonzero((variation_type >= 0.8) & (variation_type < 0.9))
+    num_parts = pd.Series(cis_inv[fuzzy], dtype=object).str.replace(r'\D', '', regex=True).to_numpy(str)
+    has_digits = np.char.str_len(num_parts) >= 4
+    fuzzy, num_parts = fuzzy[has_digits], num_parts[has_digits]
+    typo_nums = introduce_digit_typos(num_parts, rng)
+    g2b_inv[fuzzy] = np.where(rng.random(len(fuzzy)) < 0.5, typo_nums, np.char.add('INV-', typo_nums))
+    
+    # Layer 6: PAN level (different GSTIN, same PAN)
+    # Change last 5 characters of GSTIN
+    pan_level = np.flatnonzero(variation_type >= 0.9)
+    suffixes = GSTIN_SUFFIX_CHARS[rng.integers(0, len(GSTIN_SUFFIX_CHARS), (len(pan_level), 5))]
+    suffixes = suffixes.view('S5').ravel().astype(str)
+    cis_gstin[pan_level] = np.char.add(cis_gstin[pan_level].astype('U10'), suffixes)
+    
+    g2b_gstin[:m] = cis_gstin[:m]
+    g2b_date[:m] = cis_date[:m]
+    
+    # Split rows copy their base record with amounts divided evenly
+    g2b_gstin[m:] = g2b_gstin[split_idx]
+    g2b_inv[m:] = g2b_inv[split_idx]
+    g2b_date[m:] = g2b_date[split_idx]
+    g2b_taxable[m:] = (g2b_taxable[split_idx] / split_div).round(2)
+    g2b_igst[m:] = (g2b_igst[split_idx] / split_div).round(2)
+    g2b_cgst[m:] = (g2b_cgst[split_idx] / split_div).round(2)
+    g2b_sgst[m:] = (g2b_sgst[split_idx] / split_div).round(2)
+    
+    # Generate unmatched records (only in CIS)
+    u = slice(m, m + unmatched_records)
+    cis_gstin[u] = supplier_keys[rng.integers(0, len(supplier_keys), size=unmatched_records)]
+    cis_taxable[u], cis_igst[u], cis_cgst[u], cis_sgst[u] = generate_tax_block(unmatched_records, rng)
+    for i in range(u.start, u.stop):
+        cis_inv[i] = generate_invoice_number(py_rng)
+    cis_date[u] = generate_dates(start_date, end_date, unmatched_records, rng)
     
     # Add some time-barred records (before 31 Mar 2024)
-    num_time_barred = max(2, int(num_records * 0.05))
     old_start = datetime(2023, 1, 1)
     old_end = datetime(2024, 3, 30)
     
-    for i in range(num_time_barred):
-        gstin = random.choice(list(suppliers.keys()))
-        invoice_num = generate_invoice_number()
-        invoice_date = generate_date(old_start, old_end)
-        taxable_value = generate_amount()
-        
-        tax_rate = random.choice([5, 12, 18, 28])
-        igst = round(taxable_value * tax_rate / 100, 2)
-        
-        cis_records.append({
-            'SupplierGSTIN': gstin,
-            'DocumentNumber': invoice_num,
-            'DocumentDate': invoice_date.strftime('%d/%m/%Y'),
-            'TaxableValue': taxable_value,
-            'IntegratedTaxAmount': igst,
-            'CentralTaxAmount': 0,
-            'StateUT TaxAmount': 0,
-            'SupplierName': suppliers.get(gstin[:10] + '00000', 'Unknown')[:gstin[:10]]
-        })
+    b = slice(u.stop, total_cis)
+    cis_gstin[b] = supplier_keys[rng.integers(0, len(supplier_keys), size=num_time_barred)]
+    cis_taxable[b], cis_igst[b], cis_cgst[b], cis_sgst[b] = generate_tax_block(num_time_barred, rng, only_igst=True)
+    for i in range(b.start, b.stop):
+        cis_inv[i] = generate_invoice_number(py_rng)
+    cis_date[b] = generate_dates(old_start, old_end, num_time_barred, rng)
+    
+    # Shuffle records by permuting the column arrays before building the frames
+    cis_perm = rng.permutation(total_cis)
+    cis_gstin, cis_inv, cis_date, cis_taxable, cis_igst, cis_cgst, cis_sgst = (
+        col[cis_perm] for col in (cis_gstin, cis_inv, cis_date, cis_taxable, cis_igst, cis_cgst, cis_sgst)
+    )
+    g2b_perm = rng.permutation(total_g2b)
+    g2b_gstin, g2b_inv, g2b_date, g2b_taxable, g2b_igst, g2b_cgst, g2b_sgst = (
+        col[g2b_perm] for col in (g2b_gstin, g2b_inv, g2b_date, g2b_taxable, g2b_igst, g2b_cgst, g2b_sgst)
+    )
     
     # Create DataFrames
-    df_cis = pd.DataFrame(cis_records)
-    df_g2b = pd.DataFrame(g2b_records)
+    df_cis = pd.DataFrame({
+        'SupplierGSTIN': cis_gstin,
+        'DocumentNumber': cis_inv,
+        'DocumentDate': cis_date,
+        'TaxableValue': cis_taxable,
+        'IntegratedTaxAmount': cis_igst,
+        'CentralTaxAmount': cis_cgst,
+        'StateUT TaxAmount': cis_sgst,
+        'SupplierName': [suppliers.get(g, 'Unknown') for g in cis_gstin]
+    })
     
-    # Shuffle records
-    df_cis = df_cis.sample(frac=1).reset_index(drop=True)
-    df_g2b = df_g2b.sample(frac=1).reset_index(drop=True)
+    df_g2b = pd.DataFrame({
+        'GSTIN of supplier': g2b_gstin,
+        'Invoice number': g2b_inv,
+        'Invoice Date': g2b_date,
+        'Taxable Value (₹)': g2b_taxable,
+        'Integrated Tax(₹)': g2b_igst,
+        'Central Tax(₹)': g2b_cgst,
+        'State/UT Tax(₹)': g2b_sgst
+    })
     
     print(f"✅ Generated {len(df_cis)} CIS records")
     print(f"✅ Generated {len(df_g2b)} GSTR-2B records")
@@ -270,20 +261,38 @@ def create_sample_data(num_records=100, mismatch_rate=0.15):
     
     return df_cis, df_g2b
 
+def write_excel_streaming(df, filename, sheet_name):
+    """
+    Write a DataFrame with xlsxwriter in constant_memory mode, which flushes
+    each row to disk as it goes. That mode only accepts rows in order, so the
+    rows are written directly instead of through DataFrame.to_excel (which
+    emits cells column by column).
+    """
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, [str(c) for c in df.columns])
+    for row_num, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_num, 0, row)
+    workbook.close()
+
 def save_sample_files(df_cis, df_g2b, prefix='sample'):
-    """Save sample files to Excel"""
+    """
+    Save sample files to Excel, plus a Parquet copy of each for fast
+    re-loading (the app accepts either; the .xlsx is for human inspection)
+    """
     
     cis_filename = f"{prefix}_CIS.xlsx"
     g2b_filename = f"{prefix}_GSTR2B.xlsx"
     
     # Save CIS
-    df_cis.to_excel(cis_filename, index=False, engine='openpyxl')
-    print(f"💾 Saved: {cis_filename}")
+    write_excel_streaming(df_cis, cis_filename, sheet_name='Sheet1')
+    df_cis.to_parquet(f"{prefix}_CIS.parquet", engine='pyarrow', compression='zstd', index=False)
+    print(f"💾 Saved: {cis_filename} (+ .parquet)")
     
     # Save GSTR-2B with proper formatting
-    with pd.ExcelWriter(g2b_filename, engine='openpyxl') as writer:
-        df_g2b.to_excel(writer, sheet_name='B2B', index=False)
-    print(f"💾 Saved: {g2b_filename}")
+    write_excel_streaming(df_g2b, g2b_filename, sheet_name='B2B')
+    df_g2b.to_parquet(f"{prefix}_GSTR2B.parquet", engine='pyarrow', compression='zstd', index=False)
+    print(f"💾 Saved: {g2b_filename} (+ .parquet)")
     
     return cis_filename, g2b_filename
 
@@ -293,23 +302,29 @@ if __name__ == "__main__":
     print("=" * 60)
     print()
     
-    # Generate small dataset (100 records)
-    print("Generating SMALL dataset (100 records)...")
-    df_cis_small, df_g2b_small = create_sample_data(num_records=100, mismatch_rate=0.15)
-    save_sample_files(df_cis_small, df_g2b_small, prefix='sample_small')
-    print()
+    datasets = [
+        ('SMALL', 'sample_small', 100, 0.15),
+        ('MEDIUM', 'sample_medium', 500, 0.20),
+        ('LARGE', 'sample_large', 2000, 0.25),
+    ]
     
-    # Generate medium dataset (500 records)
-    print("Generating MEDIUM dataset (500 records)...")
-    df_cis_medium, df_g2b_medium = create_sample_data(num_records=500, mismatch_rate=0.20)
-    save_sample_files(df_cis_medium, df_g2b_medium, prefix='sample_medium')
+    # Datasets are independent, so generate them concurrently (one process
+    # each, distinct seeds) and write the files once all of them are ready
+    with ProcessPoolExecutor() as executor:
+        futures = []
+        for i, (label, prefix, num_records, mismatch_rate) in enumerate(datasets):
+            print(f"Generating {label} dataset ({num_records} records)...")
+            futures.append(executor.submit(
+                create_sample_data, num_records=num_records,
+                mismatch_rate=mismatch_rate, seed=42 + i
+            ))
+        results = [future.result() for future in futures]
     print()
     
-    # Generate large dataset (2000 records)
-    print("Generating LARGE dataset (2000 records)...")
-    df_cis_large, df_g2b_large = create_sample_data(num_records=2000, mismatch_rate=0.25)
-    save_sample_files(df_cis_large, df_g2b_large, prefix='sample_large')
-    print()
+    for (label, prefix, num_records, _), (df_cis, df_g2b) in zip(datasets, results):
+        print(f"Saving {label} dataset ({num_records} records)...")
+        save_sample_files(df_cis, df_g2b, prefix=prefix)
+        print()
     
     print("=" * 60)
     print("✅ Sample data generation complete!")
@@ -319,5 +334,6 @@ if __name__ == "__main__":
     print("  1. sample_small_CIS.xlsx + sample_small_GSTR2B.xlsx")
     print("  2. sample_medium_CIS.xlsx + sample_medium_GSTR2B.xlsx")
     print("  3. sample_large_CIS.xlsx + sample_large_GSTR2B.xlsx")
+    print("  (each also saved as .parquet for faster loading)")
     print()
     print("Use these files to test the GST Reconciliation Pro app!")
@@ -4,19 +4,46 @@ import io
 import re
 import numpy as np
 from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
 from concurrent.futures import ThreadPoolExecutor
 import json
+from collections import defaultdict
 
 # Try importing rapidfuzz for speed, fallback to difflib if missing
 try:
-    from rapidfuzz import fuzz
+    from rapidfuzz import fuzz, process
     USE_RAPIDFUZZ = True
 except ImportError:
     import difflib
     USE_RAPIDFUZZ = False
 
+# Prefer the Rust-based calamine reader for .xlsx and .xls, fallback to openpyxl/xlrd if missing.
+# The *_FALLBACK_ENGINE is retried when the first read fails: the pure-Python
+# reader of the same format with calamine, else the other format's reader.
+try:
+    import python_calamine  # noqa: F401
+    XLSX_ENGINE, XLSX_FALLBACK_ENGINE = 'calamine', 'openpyxl'
+    XLS_ENGINE, XLS_FALLBACK_ENGINE = 'calamine', 'xlrd'
+except ImportError:
+    XLSX_ENGINE, XLSX_FALLBACK_ENGINE = 'openpyxl', 'xlrd'
+    XLS_ENGINE, XLS_FALLBACK_ENGINE = 'xlrd', 'openpyxl'
+
+# Partial reruns via st.fragment (Streamlit 1.37+; experimental_fragment before), else plain functions
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', lambda func: func)
+
+# orjson for the audit JSON download (C serializer, bytes out), fallback to json if missing
+try:
+    import orjson
+    USE_ORJSON = True
+except ImportError:
+    USE_ORJSON = False
+
+# Arrow-backed strings for the matching keys (vectorized compare/hash), else plain str
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = 'string[pyarrow]'
+except ImportError:
+    TEXT_DTYPE = str
+
 # ==========================================
 # PAGE CONFIGURATION
 # ==========================================
@@ -84,6 +111,14 @@ if 'match_stats' not in st.session_state:
     st.session_state.match_stats = {}
 if 'audit_log' not in st.session_state:
     st.session_state.audit_log = []
+if 'audit_df' not in st.session_state:
+    st.session_state.audit_df = pd.DataFrame()
+if 'audit_by_layer' not in st.session_state:
+    st.session_state.audit_by_layer = {}
+if 'unmatched_df' not in st.session_state:
+    st.session_state.unmatched_df = pd.DataFrame()
+if 'mismatch_analysis' not in st.session_state:
+    st.session_state.mismatch_analysis = {}
 
 # ==========================================
 # HELPER FUNCTIONS - OPTIMIZED
@@ -92,44 +127,69 @@ if 'audit_log' not in st.session_state:
 # Translation table for fast string cleaning
 import string
 TRANS_TABLE = str.maketrans('', '', string.punctuation + ' ')
+# Everything but the digits 0-9
+NON_DIGIT_RE = re.compile(r'[^0-9]')
 
-@st.cache_data
-def find_column(df, candidates):
-    """Find column name from list of candidates - cached for performance"""
-    existing_cols = {
-        str(c).strip().lower().replace(' ', '').replace('\n', '').replace('_', '').replace('(₹)', '').replace('₹', ''): c 
-        for c in df.columns
-    }
+# Separators ignored when comparing column headers
+HEADER_TRANS_TABLE = str.maketrans('', '', ' \n_')
+
+def clean_header(name):
+    """Normalize a column header / candidate name for lookup"""
+    return str(name).strip().lower().translate(HEADER_TRANS_TABLE).replace('(₹)', '').replace('₹', '')
+
+def build_column_index(df):
+    """Lookup of clean header -> column name for df (build once per file, share across find_column calls)"""
+    return {clean_header(c): c for c in df.columns}
+
+def find_column(df, candidates, column_index=None):
+    """Find column name from list of candidates (column_index: reuse a build_column_index lookup)"""
+    if column_index is None:
+        column_index = build_column_index(df)
     for cand in candidates:
-        clean_cand = cand.strip().lower().replace(' ', '').replace('_', '').replace('(₹)', '').replace('₹', '')
-        if clean_cand in existing_cols:
-            return existing_cols[clean_cand]
+        clean_cand = clean_header(cand)
+        if clean_cand in column_index:
+            return column_index[clean_cand]
     return None
 
-def clean_currency(val):
-    """Vectorized currency cleaning"""
-    if pd.isna(val) or str(val).strip() == '': 
-        return 0.0
-    if isinstance(val, (int, float)): 
-        return float(val)
-    try:
-        clean_str = str(val).replace(',', '').replace(' ', '').replace('₹', '')
-        return float(clean_str)
-    except ValueError:
-        return 0.0
-
-def normalize_gstin(gstin):
-    """Fast GSTIN normalization"""
-    if pd.isna(gstin): 
-        return ""
-    return str(gstin).strip().upper().replace(" ", "")
-
-def get_pan_from_gstin(gstin):
-    """Extract PAN from GSTIN"""
-    norm = normalize_gstin(gstin)
-    if len(norm) >= 10:
-        return norm[:10]
-    return norm
+def clean_currency_series(s):
+    """Vectorized currency cleaning for a whole column"""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.fillna(0.0).astype(float)
+    clean_str = s.astype(str).str.replace(r'[,\s₹]', '', regex=True)
+    return pd.to_numeric(clean_str, errors='coerce').fillna(0.0)
+
+def clean_currency_frame(df):
+    """
+    clean_currency_series for every column of df, as a float64 array.
+    Numeric columns are copied straight; all text cells go through a single
+    regex strip + to_numeric pass.
+    """
+    cleaned = np.zeros(df.shape, dtype=np.float64)
+    text_cols = []
+    for j in range(df.shape[1]):
+        col = df.iloc[:, j]
+        if pd.api.types.is_numeric_dtype(col):
+            cleaned[:, j] = col.fillna(0.0).astype(float)
+        else:
+            text_cols.append(j)
+    if text_cols:
+        stacked = pd.concat([df.iloc[:, j] for j in text_cols], ignore_index=True)
+        cleaned[:, text_cols] = clean_currency_series(stacked).to_numpy().reshape(len(text_cols), len(df)).T
+    return cleaned
+
+def to_text_series(s):
+    """Column as TEXT_DTYPE strings, with missing values as '' (shared by the _series helpers)"""
+    if s.dtype == TEXT_DTYPE and not s.hasnans:
+        return s
+    return s.astype(TEXT_DTYPE).fillna('')
+
+def normalize_gstin_series(s):
+    """GSTIN normalization (trim, upper case, no spaces) for a whole column"""
+    return to_text_series(s).str.strip().str.upper().str.replace(' ', '', regex=False)
+
+def get_pan_series(norm_gstin):
+    """PAN (first 10 characters) of an already normalized GSTIN column"""
+    return norm_gstin.str[:10]
 
 def get_similarity_score(s1, s2):
     """Returns similarity 0-100"""
@@ -138,97 +198,110 @@ def get_similarity_score(s1, s2):
     else:
         return difflib.SequenceMatcher(None, str(s1), str(s2)).ratio() * 100
 
-def normalize_inv_basic_fast(inv):
-    """Optimized invoice normalization using translate table"""
-    if pd.isna(inv): 
-        return ""
-    s = str(inv).upper().translate(TRANS_TABLE)
-    return s.lstrip('0') if s else ""
-
-def normalize_inv_numeric(inv):
-    """Extract only numeric characters"""
-    if pd.isna(inv): 
-        return ""
-    s = re.sub(r'[^0-9]', '', str(inv))
-    return s.lstrip('0') if s else ""
-
-def get_last_4(inv):
-    """Get last 4 digits"""
-    if pd.isna(inv): 
-        return ""
-    s = re.sub(r'[^0-9]', '', str(inv))
-    if len(s) > 4: 
-        return s[-4:]
-    return s.lstrip('0') if s else ""
+def similarity_matrix(queries, choices, workers=1):
+    """Similarity 0-100 of every query (rows) against every choice (columns)"""
+    if USE_RAPIDFUZZ:
+        # Whole matrix in a single C call
+        return process.cdist(queries, choices, scorer=fuzz.ratio, dtype=np.float64, workers=workers)
+    scores = [[get_similarity_score(q, c) for c in choices] for q in queries]
+    return np.array(scores, dtype=np.float64).reshape(len(queries), len(choices))
+
+def normalize_inv_basic_series(s):
+    """Invoice number without punctuation, spaces or leading zeros, upper case, for a whole column"""
+    return to_text_series(s).str.upper().str.translate(TRANS_TABLE).str.lstrip('0')
+
+def normalize_inv_digits_series(s):
+    """
+    Numeric invoice key (digits only, no leading zeros) and last-4 key
+    (last 4 digits, or the numeric key when there are 4 or fewer) for a
+    whole column. Extracts the digits once and derives both keys from them.
+    """
+    digits = to_text_series(s).str.replace(NON_DIGIT_RE.pattern, '', regex=True)
+    inv_num = digits.str.lstrip('0')
+    inv_last4 = digits.str[-4:].where(digits.str.len() > 4, inv_num)
+    return inv_num, inv_last4
 
 # ==========================================
 # ROBUST DATA LOADER WITH HEADER STITCHING
 # ==========================================
 @st.cache_data
-def load_gstr2b_with_stitching(file_bytes, sheet_name):
+def load_gstr2b_with_stitching(file_bytes, sheet_name=None):
     """
     Reads first 8 rows to find headers. Stitches split headers if found.
     Cached for performance. Supports both xlsx and xls formats.
+    Parquet files already carry clean headers and are returned as-is.
+    The workbook is opened once; without sheet_name, 'B2B' (else the first sheet) is read.
     """
     file_obj = io.BytesIO(file_bytes)
+    if check_excel_format(file_bytes) == 'parquet':
+        return pd.read_parquet(file_obj)
     
-    # Try to read with openpyxl first, then xlrd
-    try:
-        df_raw = pd.read_excel(file_obj, sheet_name=sheet_name, header=None, nrows=8, engine='openpyxl')
-        engine_to_use = 'openpyxl'
-    except:
+    # Read with the detected format's engine first, then the fallbacks;
+    # a failure anywhere in the read moves on to the next engine
+    if check_excel_format(file_bytes) == 'xls':
+        engines = [XLS_ENGINE, XLS_FALLBACK_ENGINE, XLSX_FALLBACK_ENGINE]
+    else:
+        engines = [XLSX_ENGINE, XLSX_FALLBACK_ENGINE, XLS_FALLBACK_ENGINE]
+    for engine in dict.fromkeys(engines):
+        file_obj.seek(0)
         try:
-            file_obj.seek(0)
-            df_raw = pd.read_excel(file_obj, sheet_name=sheet_name, header=None, nrows=8, engine='xlrd')
-            engine_to_use = 'xlrd'
+            with pd.ExcelFile(file_obj, engine=engine) as xl:
+                sheet = sheet_name
+                if sheet is None:
+                    sheet = 'B2B' if 'B2B' in xl.sheet_names else xl.sheet_names[0]
+                elif isinstance(sheet, str) and sheet not in xl.sheet_names:
+                    sheet = xl.sheet_names[0]
+                
+                df_raw = xl.parse(sheet, header=None, nrows=8)
+                final_headers, header_end_row = stitch_gstr2b_headers(df_raw)
+                
+                # The last header row is the pandas header; data starts right below it
+                df_final = xl.parse(sheet, header=header_end_row)
+            break
         except Exception as e:
-            # Get sheet names for fallback
-            file_obj.seek(0)
-            try:
-                xl = pd.ExcelFile(file_obj, engine='openpyxl')
-                engine_to_use = 'openpyxl'
-            except:
-                file_obj.seek(0)
-                try:
-                    xl = pd.ExcelFile(file_obj, engine='xlrd')
-                    engine_to_use = 'xlrd'
-                except:
-                    raise ValueError(
-                        f"Could not read GSTR-2B file. Please ensure:\n"
-                        f"1. File is a valid Excel file (.xlsx or .xls)\n"
-                        f"2. File is not corrupted\n"
-                        f"3. File is not password protected\n"
-                        f"Original error: {str(e)}"
-                    )
-            
-            file_obj.seek(0)
-            df_raw = pd.read_excel(file_obj, sheet_name=xl.sheet_names[0], header=None, nrows=8, engine=engine_to_use)
-    
-    idx_gstin = -1
-    idx_inv = -1
+            error = e
+    else:
+        raise ValueError(
+            f"Could not read GSTR-2B file. Please ensure:\n"
+            f"1. File is a valid Excel file (.xlsx or .xls)\n"
+            f"2. File is not corrupted\n"
+            f"3. File is not password protected\n"
+            f"Original error: {str(error)}"
+        )
     
-    def row_contains(row_idx, keyword):
-        row_vals = df_raw.iloc[row_idx].astype(str).str.lower().values
-        return any(keyword.lower() in val for val in row_vals)
+    current_cols = len(df_final.columns)
+    if len(final_headers) >= current_cols:
+        df_final.columns = final_headers[:current_cols]
+    else:
+        df_final.columns = final_headers + [f"Col_{i}" for i in range(current_cols - len(final_headers))]
+        
+    return df_final
 
-    for i in range(len(df_raw)):
-        if row_contains(i, 'gstin'): 
-            idx_gstin = i
-        if row_contains(i, 'invoice number') or row_contains(i, 'invoice no'): 
-            idx_inv = i
-            
-    if idx_gstin == -1: 
-        idx_gstin = 0
-    if idx_inv == -1: 
-        idx_inv = 0
+def stitch_gstr2b_headers(df_raw):
+    """Column names from the (up to two) header rows in df_raw, and the last header row"""
+    # Scan the whole header grid at once (NaN cells become 'nan')
+    raw_cells = df_raw.to_numpy().astype(str)
+    lower_cells = np.char.lower(raw_cells)
+    
+    def rows_containing(*keywords):
+        hits = np.zeros(lower_cells.shape, dtype=bool)
+        for keyword in keywords:
+            hits |= np.char.find(lower_cells, keyword) >= 0
+        return np.flatnonzero(hits.any(axis=1))
+    
+    # The last matching row wins, as with a top-down scan
+    gstin_rows = rows_containing('gstin')
+    inv_rows = rows_containing('invoice number', 'invoice no')
+    idx_gstin = int(gstin_rows[-1]) if len(gstin_rows) else 0
+    idx_inv = int(inv_rows[-1]) if len(inv_rows) else 0
     
     header_end_row = max(idx_gstin, idx_inv)
     final_headers = []
     num_cols = df_raw.shape[1]
     
     for c in range(num_cols):
-        val_gstin = str(df_raw.iloc[idx_gstin, c]).strip()
-        val_inv = str(df_raw.iloc[idx_inv, c]).strip()
+        val_gstin = raw_cells[idx_gstin, c].strip()
+        val_inv = raw_cells[idx_inv, c].strip()
         
         if val_gstin.lower() == 'nan': 
             val_gstin = ""
@@ -241,30 +314,21 @@ def load_gstr2b_with_stitching(file_bytes, sheet_name):
             final_headers.append(val_gstin)
         else:
             final_headers.append(f"Column_{c}")
-
-    file_obj.seek(0)
-    try:
-        df_final = pd.read_excel(file_obj, sheet_name=sheet_name, header=header_end_row + 1, engine=engine_to_use)
-    except:
-        file_obj.seek(0)
-        df_final = pd.read_excel(file_obj, sheet_name=0, header=header_end_row + 1, engine=engine_to_use)
     
-    current_cols = len(df_final.columns)
-    if len(final_headers) >= current_cols:
-        df_final.columns = final_headers[:current_cols]
-    else:
-        df_final.columns = final_headers + [f"Col_{i}" for i in range(current_cols - len(final_headers))]
-        
-    return df_final
+    return final_headers, header_end_row
 
 def check_excel_format(file_bytes):
     """
     Check if file is valid Excel format by checking magic bytes
-    Returns: ('xlsx', 'xls', 'unknown')
+    Returns: ('xlsx', 'xls', 'parquet', 'unknown')
     """
     if not file_bytes or len(file_bytes) < 8:
         return 'unknown'
     
+    # Check for Parquet format (PAR1 at both ends)
+    if file_bytes[:4] == b'PAR1' and file_bytes[-4:] == b'PAR1':
+        return 'parquet'
+    
     # Check for XLSX format (ZIP file signature)
     if file_bytes[:4] == b'PK\x03\x04':
         return 'xlsx'
@@ -281,14 +345,18 @@ def load_cis_file(file_bytes):
     file_size = len(file_bytes) if file_bytes else 0
     file_format = check_excel_format(file_bytes)
     
+    # Parquet needs no engine fallbacks
+    if file_format == 'parquet':
+        return pd.read_parquet(io.BytesIO(file_bytes))
+    
     # Try the detected format first
     if file_format == 'xlsx':
         try:
-            return pd.read_excel(io.BytesIO(file_bytes), engine='openpyxl')
+            return pd.read_excel(io.BytesIO(file_bytes), engine=XLSX_ENGINE)
         except Exception as e1:
-            # Maybe it's mislabeled, try xls
+            # Maybe it's mislabeled (or trips calamine), retry
             try:
-                return pd.read_excel(io.BytesIO(file_bytes), engine='xlrd')
+                return pd.read_excel(io.BytesIO(file_bytes), engine=XLSX_FALLBACK_ENGINE)
             except Exception as e2:
                 error_msg = f"""
 Could not read CIS Excel file. 
@@ -296,8 +364,8 @@ Could not read CIS Excel file.
 **File Information:**
 - File size: {file_size:,} bytes
 - Detected format: {file_format}
-- Error with openpyxl (.xlsx): {str(e1)[:100]}
-- Error with xlrd (.xls): {str(e2)[:100]}
+- Error with {XLSX_ENGINE}: {str(e1)[:100]}
+- Error with {XLSX_FALLBACK_ENGINE}: {str(e2)[:100]}
 
 **Please ensure:**
 1. File is a valid Excel file (.xlsx or .xls format)
@@ -314,11 +382,11 @@ Could not read CIS Excel file.
     
     elif file_format == 'xls':
         try:
-            return pd.read_excel(io.BytesIO(file_bytes), engine='xlrd')
+            return pd.read_excel(io.BytesIO(file_bytes), engine=XLS_ENGINE)
         except Exception as e1:
-            # Maybe it's mislabeled, try xlsx
+            # Maybe it's mislabeled (or trips calamine), retry
             try:
-                return pd.read_excel(io.BytesIO(file_bytes), engine='openpyxl')
+                return pd.read_excel(io.BytesIO(file_bytes), engine=XLS_FALLBACK_ENGINE)
             except Exception as e2:
                 error_msg = f"""
 Could not read CIS Excel file. 
@@ -326,8 +394,8 @@ Could not read CIS Excel file.
 **File Information:**
 - File size: {file_size:,} bytes
 - Detected format: {file_format}
-- Error with xlrd (.xls): {str(e1)[:100]}
-- Error with openpyxl (.xlsx): {str(e2)[:100]}
+- Error with {XLS_ENGINE}: {str(e1)[:100]}
+- Error with {XLS_FALLBACK_ENGINE}: {str(e2)[:100]}
 
 **Please ensure:**
 1. File is a valid Excel file (.xlsx or .xls format)
@@ -344,7 +412,7 @@ Could not read CIS Excel file.
     else:
         # Unknown format, try both
         try:
-            return pd.read_excel(io.BytesIO(file_bytes), engine='openpyxl')
+            return pd.read_excel(io.BytesIO(file_bytes), engine=XLSX_ENGINE)
         except Exception as e1:
             try:
                 return pd.read_excel(io.BytesIO(file_bytes), engine='xlrd')
@@ -371,9 +439,11 @@ The file signature doesn't match .xlsx or .xls formats.
 # ==========================================
 # FILE VALIDATION
 # ==========================================
-def validate_file(df, file_type, required_columns):
+def validate_file(df, file_type, required_columns, column_index=None):
     """Validate uploaded file structure"""
     issues = []
+    if column_index is None:
+        column_index = build_column_index(df)
     
     if df.empty:
         issues.append(f"❌ {file_type} file is empty")
@@ -381,10 +451,11 @@ def validate_file(df, file_type, required_columns):
     if len(df.columns) < 5:
         issues.append(f"⚠️ {file_type} file has very few columns ({len(df.columns)})")
     
+    # Only presence matters here: one set-style membership test per alias,
+    # stopping at the first alias found
     missing_cols = []
     for col_key, col_candidates in required_columns.items():
-        found = find_column(df, col_candidates)
-        if not found:
+        if not any(clean_header(cand) in column_index for cand in col_candidates):
             missing_cols.append(col_candidates[0])
     
     if missing_cols:
@@ -408,22 +479,25 @@ def suggest_column_mapping(df, expected_columns):
     """Use fuzzy matching to auto-suggest column mappings"""
     suggestions = {}
     confidence_scores = {}
+    columns = list(df.columns)
+    col_names = [str(col).lower() for col in columns]
     
     for expected_key, candidates in expected_columns.items():
-        scores = {}
-        for candidate in candidates:
-            for col in df.columns:
-                score = get_similarity_score(candidate.lower(), str(col).lower())
-                if col not in scores or score > scores[col]:
-                    scores[col] = score
+        if not candidates or not columns:
+            continue
         
-        if scores:
-            best_match = max(scores, key=scores.get)
-            best_score = scores[best_match]
-            
-            if best_score > 60:  # 60% threshold
-                suggestions[expected_key] = best_match
-                confidence_scores[expected_key] = best_score
+        cand_names = [candidate.lower() for candidate in candidates]
+        score_matrix = similarity_matrix(cand_names, col_names)
+        
+        # Best score per column, then the first column with the overall best
+        col_scores = score_matrix.max(axis=0)
+        best_idx = int(col_scores.argmax())
+        best_match = columns[best_idx]
+        best_score = float(col_scores[best_idx])
+        
+        if best_score > 60:  # 60% threshold
+            suggestions[expected_key] = best_match
+            confidence_scores[expected_key] = best_score
     
     return suggestions, confidence_scores
 
@@ -441,24 +515,26 @@ def analyze_mismatches(cis_unmatched, col_map):
         'time_barred': 0
     }
     
-    for idx, row in cis_unmatched.iterrows():
-        # Check invoice format
-        inv = row.get('Inv_Basic', '')
-        if not inv or len(str(inv)) < 2:
-            analysis['invoice_format_issues'] += 1
-        
-        # Check GSTIN
-        gstin = row.get('Norm_GSTIN', '')
-        if not gstin or len(str(gstin)) != 15:
-            analysis['gstin_issues'] += 1
-        
-        # Check amounts
-        if row.get('Grand_Total', 0) == 0:
-            analysis['amount_issues'] += 1
-        
-        # Check time barred
-        if 'Time Barred' in str(row.get('Short Remark', '')):
-            analysis['time_barred'] += 1
+    def column(name, default):
+        # Missing columns behave like row.get(name, default) on every row
+        if name in cis_unmatched.columns:
+            return cis_unmatched[name]
+        return pd.Series(default, index=cis_unmatched.index)
+    
+    # Check invoice format
+    inv = column('Inv_Basic', '').astype(str)
+    analysis['invoice_format_issues'] = int((inv.str.len() < 2).sum())
+    
+    # Check GSTIN
+    gstin = column('Norm_GSTIN', '').astype(str)
+    analysis['gstin_issues'] = int((gstin.str.len() != 15).sum())
+    
+    # Check amounts
+    analysis['amount_issues'] = int((column('Grand_Total', 0) == 0).sum())
+    
+    # Check time barred
+    remarks = column('Short Remark', '').astype(str)
+    analysis['time_barred'] = int(remarks.str.contains('Time Barred', regex=False).sum())
     
     return analysis
 
@@ -466,26 +542,34 @@ def analyze_mismatches(cis_unmatched, col_map):
 # CORE RECONCILIATION ENGINE - OPTIMIZED
 # ==========================================
 def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b, 
-                                tol_std, tol_high, progress_callback=None):
+                                tol_std, tol_high, progress_callback=None, 
+                                enable_fuzzy=True, enable_reverse=True):
     """
     Enhanced 8-layer reconciliation with performance optimizations
+    (Layers 7 and 8 are skipped when enable_fuzzy / enable_reverse is off)
     """
     
     def update_progress(message, percent):
         if progress_callback:
             progress_callback(message, percent)
     
+    # Source column names, looked up once (also used inside the layer loops)
+    gstin_col_cis, inv_col_cis, date_col_cis = (col_map_cis[k] for k in ['GSTIN', 'INVOICE', 'DATE'])
+    gstin_col_g2b, inv_col_g2b, date_col_g2b = (col_map_g2b[k] for k in ['GSTIN', 'INVOICE', 'DATE'])
+    
     # --- A. PREPROCESSING ---
     update_progress("Preprocessing data...", 10)
     
-    cis_proc = cis_df.copy()
-    g2b_proc = gstr2b_df.copy()
+    # Work on the mapped columns (plus existing IDs) only; the results are
+    # re-attached to the full source frames at the end
+    cis_work_cols = list(col_map_cis.values()) + [c for c in ['Index CIS'] if c in cis_df.columns]
+    g2b_work_cols = list(col_map_g2b.values()) + [c for c in ['INDEX'] if c in gstr2b_df.columns]
+    cis_proc = cis_df[list(dict.fromkeys(cis_work_cols))].copy()
+    g2b_proc = gstr2b_df[list(dict.fromkeys(g2b_work_cols))].copy()
 
-    # Drop temp columns if they exist (SAFETY FIX)
+    # Temp columns, never carried into the results (SAFETY FIX)
     temp_cols = ['Norm_GSTIN', 'Norm_PAN', 'Inv_Basic', 'Inv_Num', 'Inv_Last4', 
-                 'Taxable', 'Tax', 'Grand_Total']
-    cis_proc.drop(columns=[c for c in temp_cols if c in cis_proc.columns], inplace=True)
-    g2b_proc.drop(columns=[c for c in temp_cols if c in g2b_proc.columns], inplace=True)
+                 'Taxable', 'Tax', 'Grand_Total', '_date']
 
     # IDs
     if 'Index CIS' not in cis_proc.columns: 
@@ -494,33 +578,43 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
         g2b_proc['INDEX'] = g2b_proc.index + 100000 
 
     # Keys: GSTIN & PAN (Vectorized)
-    cis_proc['Norm_GSTIN'] = cis_proc[col_map_cis['GSTIN']].apply(normalize_gstin)
-    cis_proc['Norm_PAN'] = cis_proc[col_map_cis['GSTIN']].apply(get_pan_from_gstin)
+    cis_proc['Norm_GSTIN'] = normalize_gstin_series(cis_proc[gstin_col_cis])
+    cis_proc['Norm_PAN'] = get_pan_series(cis_proc['Norm_GSTIN'])
     
-    g2b_proc['Norm_GSTIN'] = g2b_proc[col_map_g2b['GSTIN']].apply(normalize_gstin)
-    g2b_proc['Norm_PAN'] = g2b_proc[col_map_g2b['GSTIN']].apply(get_pan_from_gstin)
+    g2b_proc['Norm_GSTIN'] = normalize_gstin_series(g2b_proc[gstin_col_g2b])
+    g2b_proc['Norm_PAN'] = get_pan_series(g2b_proc['Norm_GSTIN'])
+
+    # Keys: Invoices (Vectorized, one text conversion per column)
+    cis_inv_text = to_text_series(cis_proc[inv_col_cis])
+    cis_proc['Inv_Basic'] = normalize_inv_basic_series(cis_inv_text)
+    cis_proc['Inv_Num'], cis_proc['Inv_Last4'] = normalize_inv_digits_series(cis_inv_text)
 
-    # Keys: Invoices (Optimized)
-    cis_proc['Inv_Basic'] = cis_proc[col_map_cis['INVOICE']].apply(normalize_inv_basic_fast)
-    cis_proc['Inv_Num'] = cis_proc[col_map_cis['INVOICE']].apply(normalize_inv_numeric)
-    cis_proc['Inv_Last4'] = cis_proc[col_map_cis['INVOICE']].apply(get_last_4)
+    g2b_inv_text = to_text_series(g2b_proc[inv_col_g2b])
+    g2b_proc['Inv_Basic'] = normalize_inv_basic_series(g2b_inv_text)
+    g2b_proc['Inv_Num'], g2b_proc['Inv_Last4'] = normalize_inv_digits_series(g2b_inv_text)
 
-    g2b_proc['Inv_Basic'] = g2b_proc[col_map_g2b['INVOICE']].apply(normalize_inv_basic_fast)
-    g2b_proc['Inv_Num'] = g2b_proc[col_map_g2b['INVOICE']].apply(normalize_inv_numeric)
-    g2b_proc['Inv_Last4'] = g2b_proc[col_map_g2b['INVOICE']].apply(get_last_4)
+    # Key columns as categoricals with one shared category set per key, so
+    # groupby and merges hash integer codes (merges need identical dtypes)
+    for col in ['Norm_GSTIN', 'Norm_PAN', 'Inv_Basic', 'Inv_Num', 'Inv_Last4']:
+        categories = pd.Index(cis_proc[col].unique()).union(g2b_proc[col].unique())
+        key_dtype = pd.CategoricalDtype(categories)
+        cis_proc[col] = cis_proc[col].astype(key_dtype)
+        g2b_proc[col] = g2b_proc[col].astype(key_dtype)
 
     # Financials (Vectorized)
-    cis_proc['Taxable'] = cis_proc[col_map_cis['TAXABLE']].apply(clean_currency)
-    cis_proc['Tax'] = (cis_proc[col_map_cis['IGST']].apply(clean_currency) + 
-                       cis_proc[col_map_cis['CGST']].apply(clean_currency) + 
-                       cis_proc[col_map_cis['SGST']].apply(clean_currency))
-    cis_proc['Grand_Total'] = cis_proc['Taxable'] + cis_proc['Tax']
-
-    g2b_proc['Taxable'] = g2b_proc[col_map_g2b['TAXABLE']].apply(clean_currency)
-    g2b_proc['Tax'] = (g2b_proc[col_map_g2b['IGST']].apply(clean_currency) + 
-                       g2b_proc[col_map_g2b['CGST']].apply(clean_currency) + 
-                       g2b_proc[col_map_g2b['SGST']].apply(clean_currency))
-    g2b_proc['Grand_Total'] = g2b_proc['Taxable'] + g2b_proc['Tax']
+    money_keys = ['TAXABLE', 'IGST', 'CGST', 'SGST']
+    for proc, col_map in ((cis_proc, col_map_cis), (g2b_proc, col_map_g2b)):
+        money = clean_currency_frame(proc[[col_map[k] for k in money_keys]])
+        proc['Taxable'] = money[:, 0]
+        proc['Tax'] = money[:, 1] + money[:, 2] + money[:, 3]
+        proc['Grand_Total'] = proc['Taxable'] + proc['Tax']
+
+    # Dates: parsed once per column (format='mixed' parses each value on its own,
+    # exactly like a scalar pd.to_datetime call)
+    cis_proc['_date'] = pd.to_datetime(cis_proc[date_col_cis], dayfirst=True, 
+                                       errors='coerce', format='mixed')
+    g2b_proc['_date'] = pd.to_datetime(g2b_proc[date_col_g2b], dayfirst=True, 
+                                       errors='coerce', format='mixed')
 
     # Initialize Output Columns
     cis_proc['Matching Status'] = "Unmatched"
@@ -536,20 +630,36 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
     # --- B. GROUPING (Standard Clubbing) ---
     update_progress("Grouping CIS records...", 20)
     
-    cis_grouped = cis_proc.groupby(['Norm_GSTIN', 'Norm_PAN', 'Inv_Basic']).agg({
+    # Groups in order of first appearance in the CIS file (no key sort)
+    cis_grouped = cis_proc.groupby(['Norm_GSTIN', 'Norm_PAN', 'Inv_Basic'], 
+                                   sort=False, observed=True).agg({
         'Taxable': 'sum', 
         'Tax': 'sum', 
         'Grand_Total': 'sum',
         'Inv_Num': 'first', 
         'Inv_Last4': 'first',
-        col_map_cis['INVOICE']: 'first', 
-        col_map_cis['DATE']: 'first',
+        inv_col_cis: 'first', 
+        '_date': 'first',
         'Index CIS': list
     }).reset_index()
-    cis_grouped['Matched_Flag'] = False
+    # Matched flag per CIS group (cis_grouped has a RangeIndex, so label == position)
+    cis_matched = np.zeros(len(cis_grouped), dtype=bool)
+    # G2B match state per row position (0 = unmatched, 1 = matched); written
+    # back to g2b_proc['Matching Status'] once after all layers
+    g2b_status = np.zeros(len(g2b_proc), dtype=np.int8)
 
     match_stats = {}
-    audit_log = []
+    # Audit trail buffered column-wise; one timestamp per layer (taken at its
+    # first match), rows zipped into the audit_log dicts once at the end
+    audit_cols = {'timestamp': [], 'layer': [], 'cis_ids': [], 'g2b_ids': [], 
+                  'difference': [], 'detail': []}
+    layer_stamps = {}
+    
+    # Pending commit_match updates, applied in one batch by flush_matches
+    pending_cis = []   # (Index CIS, status, layer name, GSTR 2B Key, short remark, Detailed Remark)
+    pending_g2b = []   # (INDEX, CIS Key)
+    # Comments&Remarks per Index CIS, written to cis_proc once after all layers
+    comments_map = defaultdict(str)
 
     # --- C. HELPER: COMMIT MATCH WITH AUDIT ---
     def commit_match(layer_name, row_cis, row_g2b, diff_grand, detail_str, 
@@ -560,37 +670,50 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
             g2b_indices = g2b_ids
         else:
             cis_indices = row_cis['Index CIS']
-            g2b_indices = [row_g2b['INDEX']]
-            cis_grouped.at[row_cis.name, 'Matched_Flag'] = True
+            g2b_indices = g2b_ids if g2b_ids is not None else [row_g2b['INDEX']]
+            cis_matched[row_cis.name] = True
 
         # Audit logging
-        audit_log.append({
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'layer': layer_name,
-            'cis_ids': str(cis_indices),
-            'g2b_ids': str(g2b_indices),
-            'difference': round(diff_grand, 2),
-            'detail': detail_str
-        })
-
-        # Update GSTR-2B
+        if layer_name not in layer_stamps:
+            layer_stamps[layer_name] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        audit_cols['timestamp'].append(layer_stamps[layer_name])
+        audit_cols['layer'].append(layer_name)
+        audit_cols['cis_ids'].append(str(cis_indices))
+        audit_cols['g2b_ids'].append(str(g2b_indices))
+        audit_cols['difference'].append(round(diff_grand, 2))
+        audit_cols['detail'].append(detail_str)
+
+        # Queue GSTR-2B updates
+        cis_key = str(cis_indices[0]) if len(cis_indices) == 1 else ", ".join(map(str, cis_indices))
         for g_idx in g2b_indices:
-            g2b_proc.loc[g2b_proc['INDEX'] == g_idx, 'Matching Status'] = "Matched"
-            g2b_proc.loc[g2b_proc['INDEX'] == g_idx, 'CIS Key'] = ", ".join(map(str, cis_indices))
+            pending_g2b.append((g_idx, cis_key))
 
-        # Update CIS Lines
+        # Queue CIS Lines updates
+        g2b_key = str(g2b_indices[0]) if len(g2b_indices) == 1 else ", ".join(map(str, g2b_indices))
         for cis_id in cis_indices:
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Matching Status'] = "Matched"
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Match Category'] = layer_name
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'GSTR 2B Key'] = ", ".join(map(str, g2b_indices))
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Short Remark'] = "Matched"
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Detailed Remark'] = detail_str
+            pending_cis.append((cis_id, "Matched", layer_name, g2b_key, "Matched", detail_str))
             
-            existing = str(cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Comments&Remarks'].values[0])
-            if existing == 'nan': 
-                existing = ""
-            new_rem = f"{existing} | {layer_name}".strip(" |")
-            cis_proc.loc[cis_proc['Index CIS'] == cis_id, 'Comments&Remarks'] = new_rem
+            existing = comments_map[cis_id]
+            comments_map[cis_id] = f"{existing} | {layer_name}" if existing else layer_name
+
+    def apply_updates(df, id_col, updates, columns):
+        """Write (id, *values) update rows into df with one .loc block assignment"""
+        upd = pd.DataFrame(updates, columns=[id_col] + columns)
+        upd = upd.drop_duplicates(id_col, keep='last').set_index(id_col)
+        hit = df[id_col].isin(upd.index)
+        df.loc[hit, columns] = upd.reindex(df.loc[hit, id_col]).to_numpy()
+
+    def flush_matches():
+        """Write all pending matches (last update per ID wins)"""
+        if pending_cis:
+            apply_updates(cis_proc, 'Index CIS', pending_cis, 
+                          ['Matching Status', 'Match Category', 'GSTR 2B Key', 'Short Remark', 'Detailed Remark'])
+            pending_cis.clear()
+        
+        if pending_g2b:
+            apply_updates(g2b_proc, 'INDEX', pending_g2b, ['CIS Key'])
+            g2b_status[g2b_proc['INDEX'].isin([g_idx for g_idx, _ in pending_g2b]).to_numpy()] = 1
+            pending_g2b.clear()
 
     # --- D. STANDARD LAYERS (1-6) - OPTIMIZED ---
     def run_standard_layer(layer_name, join_col_cis, join_col_g2b, tolerance, 
@@ -598,71 +721,85 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
         count = 0
         update_progress(f"Running {layer_name}...", progress_pct)
         
-        for idx, row_cis in cis_grouped.iterrows():
-            if row_cis['Matched_Flag']: 
-                continue
-            
-            gstin = row_cis['Norm_GSTIN']
-            pan = row_cis['Norm_PAN']
-            inv_val = row_cis[join_col_cis]
+        key_col = 'Norm_PAN' if use_pan else 'Norm_GSTIN'
+        
+        # Candidate pairs: one hash join of unmatched CIS groups with unmatched G2B rows
+        cis_open = ~cis_matched & (cis_grouped[join_col_cis].str.len() >= 2).to_numpy()
+        left = cis_grouped.loc[cis_open, [key_col, join_col_cis, 'Taxable', 'Tax', 'Grand_Total']]
+        left = left.rename_axis('cis_label').reset_index()
+        g2b_open = g2b_status == 0
+        right = g2b_proc.loc[g2b_open, [key_col, join_col_g2b, 'Taxable', 'Tax', 'Grand_Total']]
+        right['g2b_pos'] = np.flatnonzero(g2b_open)
+        
+        candidates = left.merge(right, left_on=[key_col, join_col_cis], right_on=[key_col, join_col_g2b], 
+                                suffixes=('_cis', '_g2b'))
+        
+        # Compare (vectorized over all pairs)
+        diff_grand = (candidates['Grand_Total_cis'] - candidates['Grand_Total_g2b']).abs()
+        if strict_tax_split:
+            diff_taxable = (candidates['Taxable_cis'] - candidates['Taxable_g2b']).abs()
+            diff_tax = (candidates['Tax_cis'] - candidates['Tax_g2b']).abs()
+            is_match = (diff_taxable <= tolerance) & (diff_tax <= tolerance)
+        else:
+            is_match = diff_grand <= tolerance
+        candidates = candidates.assign(diff_grand=diff_grand)[is_match]
+        candidates = candidates.sort_values(['cis_label', 'g2b_pos'])
+        
+        # Each CIS group (in order) takes its first G2B row not already taken.
+        # Groups before the first clash over a G2B row just take their first
+        # candidate; only the tail from that clash on needs the sequential walk.
+        first = candidates.drop_duplicates('cis_label')
+        clash = first['g2b_pos'].duplicated().to_numpy()
+        if clash.any():
+            cut = first['cis_label'].to_numpy()[clash.argmax()]
+            head = first[first['cis_label'] < cut]
+            tail = candidates[candidates['cis_label'] >= cut]
+            selected = list(zip(head['cis_label'], head['g2b_pos'], head['diff_grand']))
+            matched_cis = set()
+            used_g2b = set(head['g2b_pos'])
+            for cis_label, g2b_pos, diff_grand in zip(tail['cis_label'], tail['g2b_pos'], tail['diff_grand']):
+                if cis_label in matched_cis or g2b_pos in used_g2b: 
+                    continue
+                matched_cis.add(cis_label)
+                used_g2b.add(g2b_pos)
+                selected.append((cis_label, g2b_pos, diff_grand))
+        else:
+            selected = zip(first['cis_label'], first['g2b_pos'], first['diff_grand'])
+        
+        g2b_index = g2b_proc['INDEX'].tolist()
+        for cis_label, g2b_pos, diff_grand in selected:
+            row_cis = cis_grouped.loc[cis_label]
+            row_g2b = g2b_proc.iloc[g2b_pos]
             
-            if not inv_val or len(str(inv_val)) < 2: 
-                continue
-
-            # Filter G2B (Vectorized where possible)
-            mask = (g2b_proc['Matching Status'] == "Unmatched") & (g2b_proc[join_col_g2b] == inv_val)
-            if use_pan:
-                mask = mask & (g2b_proc['Norm_PAN'] == pan) 
+            # Build Remark
+            matched_parts = ["GSTIN" if not use_pan else "PAN"]
+            if join_col_cis == "Inv_Basic": 
+                matched_parts.append("Invoice Number")
+            elif join_col_cis == "Inv_Num": 
+                matched_parts.append(f"Numeric Invoice ({row_cis[inv_col_cis]} vs {row_g2b[inv_col_g2b]})")
+            elif join_col_cis == "Inv_Last4": 
+                matched_parts.append(f"Last 4 Digits ({row_cis[inv_col_cis]} vs {row_g2b[inv_col_g2b]})")
+
+            if strict_tax_split:
+                matched_parts.extend(["Taxable Value", "Tax Amount"])
             else:
-                mask = mask & (g2b_proc['Norm_GSTIN'] == gstin)
-            
-            candidates = g2b_proc[mask]
-            if candidates.empty: 
-                continue
-
-            for g2b_idx, row_g2b in candidates.iterrows():
-                # Compare
-                diff_grand = abs(row_cis['Grand_Total'] - row_g2b['Grand_Total'])
-                diff_taxable = abs(row_cis['Taxable'] - row_g2b['Taxable'])
-                diff_tax = abs(row_cis['Tax'] - row_g2b['Tax'])
-                
-                is_match = False
-                if strict_tax_split:
-                    if diff_taxable <= tolerance and diff_tax <= tolerance: 
-                        is_match = True
-                else:
-                    if diff_grand <= tolerance: 
-                        is_match = True
-
-                if is_match:
-                    # Build Remark
-                    matched_parts = ["GSTIN" if not use_pan else "PAN"]
-                    if join_col_cis == "Inv_Basic": 
-                        matched_parts.append("Invoice Number")
-                    elif join_col_cis == "Inv_Num": 
-                        matched_parts.append(f"Numeric Invoice ({row_cis[col_map_cis['INVOICE']]} vs {row_g2b[col_map_g2b['INVOICE']]})")
-                    elif join_col_cis == "Inv_Last4": 
-                        matched_parts.append(f"Last 4 Digits ({row_cis[col_map_cis['INVOICE']]} vs {row_g2b[col_map_g2b['INVOICE']]})")
-
-                    if strict_tax_split:
-                        matched_parts.extend(["Taxable Value", "Tax Amount"])
-                    else:
-                        matched_parts.append(f"Grand Total (Diff: ₹{diff_grand:.2f})")
+                matched_parts.append(f"Grand Total (Diff: ₹{diff_grand:.2f})")
 
-                    # Date check
-                    cis_date = pd.to_datetime(row_cis[col_map_cis['DATE']], dayfirst=True, errors='coerce')
-                    g2b_date = pd.to_datetime(row_g2b[col_map_g2b['DATE']], dayfirst=True, errors='coerce')
-                    if pd.notna(cis_date) and pd.notna(g2b_date) and cis_date == g2b_date:
-                        matched_parts.append("Date")
+            # Date check
+            cis_date = row_cis['_date']
+            g2b_date = row_g2b['_date']
+            if pd.notna(cis_date) and pd.notna(g2b_date) and cis_date == g2b_date:
+                matched_parts.append("Date")
 
-                    detail_str = "Matched: " + ", ".join(matched_parts)
-                    if use_pan and row_cis['Norm_GSTIN'] != row_g2b['Norm_GSTIN']:
-                        detail_str += f" | Note: Matched under different GSTIN {row_g2b['Norm_GSTIN']}"
+            detail_str = "Matched: " + ", ".join(matched_parts)
+            if use_pan and row_cis['Norm_GSTIN'] != row_g2b['Norm_GSTIN']:
+                detail_str += f" | Note: Matched under different GSTIN {row_g2b['Norm_GSTIN']}"
 
-                    commit_match(layer_name, row_cis, row_g2b, diff_grand, detail_str)
-                    count += 1
-                    break
+            commit_match(layer_name, row_cis, row_g2b, diff_grand, detail_str, 
+                         g2b_ids=[g2b_index[g2b_pos]])
+            count += 1
         
+        flush_matches()
         match_stats[layer_name] = count
 
     # --- RUN STANDARD LAYERS ---
@@ -685,50 +822,72 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
         layer_name = "Layer 7: Fuzzy Match"
         update_progress(f"Running {layer_name}...", 75)
         
-        for idx, row_cis in cis_grouped.iterrows():
-            if row_cis['Matched_Flag']: 
-                continue
-            
-            gstin = row_cis['Norm_GSTIN']
-            cis_inv = str(row_cis['Inv_Basic'])
-            if len(cis_inv) < 3: 
-                continue
-
-            # Optimization: Filter G2B by GSTIN first
-            g2b_candidates = g2b_proc[
-                (g2b_proc['Matching Status'] == "Unmatched") & 
-                (g2b_proc['Norm_GSTIN'] == gstin)
-            ]
-            
-            if g2b_candidates.empty: 
-                continue
+        cis_open = cis_grouped[~cis_matched & (cis_grouped['Inv_Basic'].str.len() >= 3).to_numpy()]
+        g2b_open_pos = np.flatnonzero(g2b_status == 0)
+        g2b_open = g2b_proc.iloc[g2b_open_pos]
+        g2b_buckets = g2b_open.groupby('Norm_GSTIN', observed=True).indices
+        
+        # Candidates share the GSTIN, so each GSTIN bucket is scored on its own
+        # as a CIS x G2B similarity matrix (in row blocks to bound memory)
+        block_rows = 512
+        buckets = [(cis_pos, g2b_buckets[gstin]) 
+                   for gstin, cis_pos in cis_open.groupby('Norm_GSTIN', observed=True).indices.items()
+                   if gstin in g2b_buckets]
+        # One bucket: let cdist use every core; many: one thread per bucket
+        workers = -1 if len(buckets) == 1 else 1
+        
+        def scan_bucket(bucket):
+            """Propose (cis_label, g2b_pos, score) matches for one GSTIN bucket (read-only)"""
+            cis_pos, g2b_pos = bucket
+            bucket_cis = cis_open.iloc[cis_pos]
+            bucket_g2b = g2b_open.iloc[g2b_pos]
+            cis_invs = bucket_cis['Inv_Basic'].astype(str).tolist()
+            g2b_invs = bucket_g2b['Inv_Basic'].astype(str).tolist()
+            cis_gt = bucket_cis['Grand_Total'].to_numpy()
+            g2b_gt = bucket_g2b['Grand_Total'].to_numpy()
+            taken = np.zeros(len(g2b_invs), dtype=bool)
+            proposed = []
             
-            best_match = None
-            best_score = 0.0
-
-            for g_idx, row_g2b in g2b_candidates.iterrows():
+            for start in range(0, len(cis_invs), block_rows):
+                block = slice(start, start + block_rows)
+                scores = similarity_matrix(cis_invs[block], g2b_invs, workers=workers)
                 # STRICT Amount Check
-                diff_grand = abs(row_cis['Grand_Total'] - row_g2b['Grand_Total'])
-                if diff_grand > tol_std: 
-                    continue
+                diff_grand = np.abs(cis_gt[block, None] - g2b_gt[None, :])
+                scores[(diff_grand > tol_std) | (scores <= 85)] = -1
                 
-                # String Similarity
-                g2b_inv = str(row_g2b['Inv_Basic'])
-                score = get_similarity_score(cis_inv, g2b_inv)
-                
-                if score > 85 and score > best_score:
-                    best_score = score
-                    best_match = row_g2b
-
-            if best_match is not None:
-                diff_grand = abs(row_cis['Grand_Total'] - best_match['Grand_Total'])
-                detail = f"Matched: GSTIN, Grand Total | Fuzzy Invoice: '{cis_inv}' vs '{best_match['Inv_Basic']}' (Similarity: {int(best_score)}%)"
-                commit_match(layer_name, row_cis, best_match, diff_grand, detail)
-                count += 1
+                # Rows in order; each takes its best (first on ties) G2B row still free
+                for i, row_scores in enumerate(scores, start=start):
+                    row_scores = np.where(taken, -1, row_scores)
+                    best = int(row_scores.argmax())
+                    if row_scores[best] > 85:
+                        taken[best] = True
+                        proposed.append((bucket_cis.index[i], g2b_open_pos[g2b_pos[best]], row_scores[best]))
+            return proposed
+        
+        # Buckets never share a CIS group or G2B row, so they are scanned in
+        # parallel without conflicts (cdist releases the GIL while scoring)
+        matches = []
+        with ThreadPoolExecutor() as pool:
+            for proposed in pool.map(scan_bucket, buckets):
+                matches.extend(proposed)
+        
+        # Commit in CIS group order, as the row-by-row scan did
+        g2b_index = g2b_proc['INDEX'].tolist()
+        for cis_label, g2b_pos, best_score in sorted(matches):
+            row_cis = cis_grouped.loc[cis_label]
+            best_match = g2b_proc.iloc[g2b_pos]
+            cis_inv = str(row_cis['Inv_Basic'])
+            diff_grand = abs(row_cis['Grand_Total'] - best_match['Grand_Total'])
+            detail = f"Matched: GSTIN, Grand Total | Fuzzy Invoice: '{cis_inv}' vs '{best_match['Inv_Basic']}' (Similarity: {int(best_score)}%)"
+            commit_match(layer_name, row_cis, best_match, diff_grand, detail, 
+                         g2b_ids=[g2b_index[g2b_pos]])
+            count += 1
         
+        flush_matches()
         match_stats[layer_name] = count
 
-    run_fuzzy_layer()
+    if enable_fuzzy:
+        run_fuzzy_layer()
 
     # --- LAYER 8: REVERSE CLUBBING ---
     def run_reverse_clubbing():
@@ -737,45 +896,43 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
         update_progress(f"Running {layer_name}...", 85)
         
         # Group Unmatched G2B
-        g2b_unmatched = g2b_proc[g2b_proc['Matching Status'] == "Unmatched"]
-        g2b_grouped = g2b_unmatched.groupby(['Norm_GSTIN', 'Inv_Basic']).agg({
+        g2b_unmatched = g2b_proc[g2b_status == 0]
+        g2b_grouped = g2b_unmatched.groupby(['Norm_GSTIN', 'Inv_Basic'], 
+                                            sort=False, observed=True).agg({
             'Grand_Total': 'sum',
             'INDEX': list
         }).reset_index()
         
-        for idx, row_cis in cis_grouped.iterrows():
-            if row_cis['Matched_Flag']: 
-                continue
-            
-            gstin = row_cis['Norm_GSTIN']
-            inv = row_cis['Inv_Basic']
-            
-            match_row = g2b_grouped[
-                (g2b_grouped['Norm_GSTIN'] == gstin) & 
-                (g2b_grouped['Inv_Basic'] == inv)
-            ]
-            
-            if match_row.empty: 
-                continue
-            
-            row_g2b_group = match_row.iloc[0]
-            diff_grand = abs(row_cis['Grand_Total'] - row_g2b_group['Grand_Total'])
+        # Join unmatched CIS groups to the G2B groups on (GSTIN, invoice); keys
+        # are unique on both sides, so each CIS group has at most one partner
+        cis_open = cis_grouped.loc[~cis_matched, ['Norm_GSTIN', 'Inv_Basic', 'Grand_Total']]
+        pairs = cis_open.rename_axis('cis_label').reset_index().merge(
+            g2b_grouped, on=['Norm_GSTIN', 'Inv_Basic'], suffixes=('_cis', '_g2b'))
+        pairs['diff_grand'] = (pairs['Grand_Total_cis'] - pairs['Grand_Total_g2b']).abs()
+        pairs = pairs[pairs['diff_grand'] <= tol_std].sort_values('cis_label')
+        
+        for cis_label, g2b_indices, diff_grand in zip(pairs['cis_label'], pairs['INDEX'], pairs['diff_grand']):
+            detail = f"Matched: GSTIN, Invoice Number | Reverse Clubbing: 1 CIS vs {len(g2b_indices)} G2B Records (Total Diff: ₹{diff_grand:.2f})"
+            row_cis = cis_grouped.loc[cis_label]
+            cis_matched[cis_label] = True
+            commit_match(layer_name, row_cis, None, diff_grand, detail, 
+                         is_reverse=True, g2b_ids=g2b_indices)
+            count += 1
             
-            if diff_grand <= tol_std:
-                g2b_indices = row_g2b_group['INDEX']
-                detail = f"Matched: GSTIN, Invoice Number | Reverse Clubbing: 1 CIS vs {len(g2b_indices)} G2B Records (Total Diff: ₹{diff_grand:.2f})"
-                cis_grouped.at[idx, 'Matched_Flag'] = True
-                commit_match(layer_name, row_cis, None, diff_grand, detail, 
-                           is_reverse=True, g2b_ids=g2b_indices)
-                count += 1
-                
+        flush_matches()
         match_stats[layer_name] = count
 
-    run_reverse_clubbing()
+    if enable_reverse:
+        run_reverse_clubbing()
 
     # --- CLEANUP & TIME BARRED ---
     update_progress("Finalizing results...", 90)
     
+    g2b_proc['Matching Status'] = np.where(g2b_status == 1, "Matched", "Unmatched")
+    
+    if comments_map:
+        cis_proc['Comments&Remarks'] = cis_proc['Index CIS'].map(comments_map).fillna("")
+    
     unmatched_mask = cis_proc['Matching Status'] == "Unmatched"
     if unmatched_mask.any():
         cis_proc.loc[unmatched_mask, 'Detailed Remark'] = "Mismatch: Invoice Number not found in GSTR-2B"
@@ -783,17 +940,22 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
 
     # Time barred check
     cutoff = pd.Timestamp("2024-03-31")
-    cis_proc['D_Obj'] = pd.to_datetime(cis_proc[col_map_cis['DATE']], dayfirst=True, errors='coerce')
-    mask = (cis_proc['D_Obj'] < cutoff) & (cis_proc['D_Obj'].notna())
+    mask = cis_proc['_date'].lt(cutoff) & cis_proc['_date'].notna()
     
     cis_proc.loc[mask, 'Short Remark'] = cis_proc.loc[mask, 'Short Remark'].astype(str) + " + Time Barred"
     cis_proc.loc[mask, 'Detailed Remark'] = cis_proc.loc[mask, 'Detailed Remark'].astype(str) + " [Warning: Date < 31 Mar 2024]"
 
-    # Drop temporary columns
-    drop_cols = ['Norm_GSTIN', 'Norm_PAN', 'Inv_Basic', 'Inv_Num', 'Inv_Last4', 
-                 'Taxable', 'Tax', 'Grand_Total', 'D_Obj']
-    cis_final = cis_proc.drop(columns=[c for c in drop_cols if c in cis_proc.columns])
-    g2b_final = g2b_proc.drop(columns=[c for c in drop_cols if c in g2b_proc.columns])
+    # Source frames (minus temp columns) plus IDs and result columns, in row order
+    cis_final = cis_df.drop(columns=[c for c in temp_cols if c in cis_df.columns])
+    for col in ['Index CIS', 'Matching Status', 'Match Category', 'Detailed Remark', 
+                'GSTR 2B Key', 'Short Remark', 'Comments&Remarks']:
+        cis_final[col] = cis_proc[col].set_axis(cis_final.index)
+    
+    g2b_final = gstr2b_df.drop(columns=[c for c in temp_cols if c in gstr2b_df.columns])
+    for col in ['INDEX', 'Matching Status', 'CIS Key']:
+        g2b_final[col] = g2b_proc[col].set_axis(g2b_final.index)
+
+    audit_log = [dict(zip(audit_cols, entry)) for entry in zip(*audit_cols.values())]
 
     update_progress("Reconciliation complete!", 100)
     
@@ -802,10 +964,16 @@ def run_8_layer_reconciliation(cis_df, gstr2b_df, col_map_cis, col_map_g2b,
 # ==========================================
 # VISUALIZATION FUNCTIONS
 # ==========================================
+# Chart caches: the latest two results, for an hour
+@st.cache_data(max_entries=2, ttl=3600)
 def create_match_pie_chart(cis_result):
     """Create pie chart for matched vs unmatched"""
-    matched = len(cis_result[cis_result['Matching Status'] == 'Matched'])
-    unmatched = len(cis_result[cis_result['Matching Status'] == 'Unmatched'])
+    # Plotly is imported on first use (tab2 after a run), not at app start
+    import plotly.graph_objects as go
+    
+    status_counts = cis_result['Matching Status'].value_counts()
+    matched = int(status_counts.get('Matched', 0))
+    unmatched = int(status_counts.get('Unmatched', 0))
     
     fig = go.Figure(data=[go.Pie(
         labels=['Matched', 'Unmatched'],
@@ -824,9 +992,12 @@ def create_match_pie_chart(cis_result):
     
     return fig
 
+@st.cache_data(max_entries=2, ttl=3600)
 def create_layer_bar_chart(match_stats):
     """Create bar chart for layer-wise matches"""
-    df_stats = pd.DataFrame(list(match_stats.items()), columns=['Layer', 'Matches'])
+    import plotly.express as px
+    
+    df_stats = pd.DataFrame({'Layer': list(match_stats), 'Matches': list(match_stats.values())})
     
     fig = px.bar(
         df_stats,
@@ -847,31 +1018,19 @@ def create_layer_bar_chart(match_stats):
     
     return fig
 
+@st.cache_data(max_entries=2, ttl=3600)
 def create_amount_distribution(cis_result):
     """Create histogram of amount distribution"""
-    matched = cis_result[cis_result['Matching Status'] == 'Matched']
-    unmatched = cis_result[cis_result['Matching Status'] == 'Unmatched']
+    import plotly.graph_objects as go
     
-    # Get grand totals
-    matched_amounts = []
-    unmatched_amounts = []
-    
-    for idx, row in matched.iterrows():
-        # Sum up taxable + taxes for display
-        try:
-            total = pd.to_numeric(row.get('Grand_Total', 0), errors='coerce')
-            if pd.notna(total) and total > 0:
-                matched_amounts.append(total)
-        except:
-            pass
-    
-    for idx, row in unmatched.iterrows():
-        try:
-            total = pd.to_numeric(row.get('Grand_Total', 0), errors='coerce')
-            if pd.notna(total) and total > 0:
-                unmatched_amounts.append(total)
-        except:
-            pass
+    # Get grand totals (positive ones only; none if the column is absent)
+    if 'Grand_Total' in cis_result.columns:
+        totals = pd.to_numeric(cis_result['Grand_Total'], errors='coerce')
+    else:
+        totals = pd.Series(0.0, index=cis_result.index)
+    status = cis_result['Matching Status']
+    matched_amounts = totals[(status == 'Matched') & (totals > 0)].tolist()
+    unmatched_amounts = totals[(status == 'Unmatched') & (totals > 0)].tolist()
     
     fig = go.Figure()
     
@@ -899,14 +1058,96 @@ def create_amount_distribution(cis_result):
     
     return fig
 
-def highlight_status(row):
-    """Apply row-wise styling based on status"""
-    if row['Matching Status'] == 'Matched':
-        return ['background-color: #d4edda'] * len(row)
-    elif 'Time Barred' in str(row.get('Short Remark', '')):
-        return ['background-color: #fff3cd'] * len(row)
+# Rows color coded in the tab1 results table / shown in the tab3 audit table
+STYLED_ROW_LIMIT = 500
+AUDIT_DISPLAY_LIMIT = 1000
+
+def highlight_status(df):
+    """Row styling based on status, for the whole frame at once (Styler.apply with axis=None)"""
+    matched = (df['Matching Status'] == 'Matched').to_numpy()
+    if 'Short Remark' in df.columns:
+        time_barred = df['Short Remark'].astype(str).str.contains('Time Barred', regex=False).to_numpy()
     else:
-        return ['background-color: #f8d7da'] * len(row)
+        time_barred = np.zeros(len(df), dtype=bool)
+    
+    row_styles = np.select([matched, time_barred], 
+                           ['background-color: #d4edda', 'background-color: #fff3cd'], 
+                           'background-color: #f8d7da')
+    return pd.DataFrame(np.repeat(row_styles[:, None], df.shape[1], axis=1), 
+                        index=df.index, columns=df.columns)
+
+# ==========================================
+# EXCEL EXPORT
+# ==========================================
+# Rows converted to Python values at a time while writing a sheet
+EXCEL_CHUNK_ROWS = 10_000
+
+def frame_to_rows(df):
+    """Yield DataFrame rows as lists of plain Python values (missing -> None), one chunk at a time"""
+    for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXCEL_CHUNK_ROWS]
+        yield from chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+
+def sheet_table(table):
+    """(header, row iterator) of a DataFrame or of a list of record dicts (keys of the first one)"""
+    if isinstance(table, pd.DataFrame):
+        return list(table.columns), frame_to_rows(table)
+    header = list(table[0]) if table else []
+    return header, ([record.get(key) for key in header] for record in table)
+
+def write_excel_report(output, sheets):
+    """
+    Write {sheet name: DataFrame or list of record dicts} to output as an .xlsx workbook.
+    constant_memory flushes each row as soon as the next one starts, so
+    sheets are written strictly row by row (DataFrame.to_excel writes
+    column by column and would lose cells in this mode).
+    """
+    # Imported on first download build, not at app start
+    import xlsxwriter
+    
+    options = {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss'
+    }
+    with xlsxwriter.Workbook(output, options) as workbook:
+        # Same header look as DataFrame.to_excel
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        # One sheet at a time, its rows converted as they are written
+        for sheet_name, table in sheets.items():
+            header, rows = sheet_table(table)
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, header, header_format)
+            for row_num, row in enumerate(rows, start=1):
+                worksheet.write_row(row_num, 0, row)
+
+# Download caches hold whole files: keep the latest two results, for an hour
+@st.cache_data(max_entries=2, ttl=3600)
+def build_excel(cis_res, g2b_res, stats_df, audit):
+    """Excel download bytes (Audit_Log sheet only when audit has entries) - cached per result"""
+    sheets = {
+        'CIS_Reconciled': cis_res,
+        'GSTR2B_Mapped': g2b_res,
+        'Statistics': stats_df
+    }
+    if audit:
+        sheets['Audit_Log'] = audit  # records written directly, no DataFrame in between
+    output = io.BytesIO()
+    write_excel_report(output, sheets)
+    return output.getvalue()
+
+@st.cache_data(max_entries=2, ttl=3600)
+def build_csv(cis_res):
+    """CSV download of the reconciled CIS data - cached per result"""
+    return cis_res.to_csv(index=False)
+
+@st.cache_data(max_entries=2, ttl=3600)
+def build_json(audit):
+    """JSON download of the audit log - cached per result"""
+    if USE_ORJSON:
+        return orjson.dumps(audit, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(audit, indent=2)
 
 # ==========================================
 # MAIN APP UI
@@ -957,21 +1198,38 @@ tab1, tab2, tab3, tab4 = st.tabs(["🚀 Reconcile", "📈 Analytics", "📋 Audi
 with tab1:
     st.subheader("Upload Your Files")
     
+    # Read (getvalue() once per upload), parsed and column-indexed by the
+    # preview blocks below, kept in session state keyed on (name, size) so
+    # reruns skip the parse, and reused by the run handler
+    cis_bytes = b""
+    g2b_bytes = b""
+    df_cis = None
+    df_g2b = None
+    cis_columns = None
+    g2b_columns = None
+    
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### 📄 CIS File")
         cis_file = st.file_uploader(
             "Upload your Credit Information Statement (CIS) Excel file",
-            type=['xlsx', 'xls'],
+            type=['xlsx', 'xls', 'parquet'],
             key="cis",
-            help="Excel file from your accounting system (.xlsx or .xls format)"
+            help="Excel file from your accounting system (.xlsx or .xls format), or a .parquet export"
         )
         
         if cis_file:
             try:
-                cis_bytes = cis_file.getvalue()
-                df_cis = load_cis_file(cis_bytes)
+                # Same upload as the last rerun: reuse the parsed frame
+                cis_sig = (cis_file.name, cis_file.size)
+                if st.session_state.get('cis_sig') != cis_sig:
+                    st.session_state.cis_bytes = cis_file.getvalue()
+                    st.session_state.cis_df = load_cis_file(st.session_state.cis_bytes)
+                    st.session_state.cis_columns = build_column_index(st.session_state.cis_df)
+                    st.session_state.cis_sig = cis_sig
+                cis_bytes = st.session_state.cis_bytes
+                df_cis = st.session_state.cis_df
                 st.success(f"✅ Loaded: {len(df_cis)} records, {len(df_cis.columns)} columns")
                 
                 # Validate
@@ -985,7 +1243,8 @@ with tab1:
                     'SGST': ['StateUT TaxAmount', 'State/UT Tax', 'SGST']
                 }
                 
-                issues = validate_file(df_cis, "CIS", cis_required)
+                cis_columns = st.session_state.cis_columns
+                issues = validate_file(df_cis, "CIS", cis_required, cis_columns)
                 if issues:
                     for issue in issues:
                         st.warning(issue)
@@ -1000,20 +1259,22 @@ with tab1:
         st.markdown("#### 📊 GSTR-2B File")
         g2b_file = st.file_uploader(
             "Upload your GSTR-2B Excel file",
-            type=['xlsx', 'xls'],
+            type=['xlsx', 'xls', 'parquet'],
             key="g2b",
-            help="Download from GST Portal (.xlsx or .xls format)"
+            help="Download from GST Portal (.xlsx or .xls format), or a .parquet export"
         )
         
         if g2b_file:
             try:
-                g2b_bytes = g2b_file.getvalue()
-                try:
-                    xl = pd.ExcelFile(io.BytesIO(g2b_bytes), engine='openpyxl')
-                except:
-                    xl = pd.ExcelFile(io.BytesIO(g2b_bytes), engine='xlrd')
-                sheet_name = 'B2B' if 'B2B' in xl.sheet_names else xl.sheet_names[0]
-                df_g2b = load_gstr2b_with_stitching(g2b_bytes, sheet_name)
+                # Same upload as the last rerun: reuse the parsed frame
+                g2b_sig = (g2b_file.name, g2b_file.size)
+                if st.session_state.get('g2b_sig') != g2b_sig:
+                    st.session_state.g2b_bytes = g2b_file.getvalue()
+                    st.session_state.g2b_df = load_gstr2b_with_stitching(st.session_state.g2b_bytes)
+                    st.session_state.g2b_columns = build_column_index(st.session_state.g2b_df)
+                    st.session_state.g2b_sig = g2b_sig
+                g2b_bytes = st.session_state.g2b_bytes
+                df_g2b = st.session_state.g2b_df
                 st.success(f"✅ Loaded: {len(df_g2b)} records, {len(df_g2b.columns)} columns")
                 
                 # Validate
@@ -1027,7 +1288,8 @@ with tab1:
                     'SGST': ['State/UT Tax(₹)', 'State/UT Tax', 'SGST']
                 }
                 
-                issues = validate_file(df_g2b, "GSTR-2B", g2b_required)
+                g2b_columns = st.session_state.g2b_columns
+                issues = validate_file(df_g2b, "GSTR-2B", g2b_required, g2b_columns)
                 if issues:
                     for issue in issues:
                         st.warning(issue)
@@ -1056,11 +1318,7 @@ with tab1:
                 progress_bar.progress(percent / 100)
             
             try:
-                # Load files using getvalue() which doesn't move file pointer
-                cis_bytes = cis_file.getvalue()
-                g2b_bytes = g2b_file.getvalue()
-                
-                # Verify we have actual data
+                # Verify we have actual data (bytes read by the preview above)
                 if not cis_bytes or len(cis_bytes) == 0:
                     st.error("❌ CIS file appears to be empty. Please re-upload the file.")
                     st.stop()
@@ -1068,13 +1326,10 @@ with tab1:
                     st.error("❌ GSTR-2B file appears to be empty. Please re-upload the file.")
                     st.stop()
                 
-                df_cis = load_cis_file(cis_bytes)
-                try:
-                    xl = pd.ExcelFile(io.BytesIO(g2b_bytes), engine='openpyxl')
-                except:
-                    xl = pd.ExcelFile(io.BytesIO(g2b_bytes), engine='xlrd')
-                sheet_name = 'B2B' if 'B2B' in xl.sheet_names else xl.sheet_names[0]
-                df_g2b = load_gstr2b_with_stitching(g2b_bytes, sheet_name)
+                # Same uploads in the same rerun: reuse the preview frames instead of parsing again
+                if df_cis is None or df_g2b is None:
+                    st.error("❌ Could not read the uploaded files. Please fix the errors shown above and re-upload.")
+                    st.stop()
                 
                 # Column mapping
                 cis_map = {
@@ -1101,7 +1356,7 @@ with tab1:
                 final_g2b_map = {}
                 
                 for k, v in cis_map.items():
-                    found = find_column(df_cis, v)
+                    found = find_column(df_cis, v, cis_columns)
                     if found:
                         final_cis_map[k] = found
                     else:
@@ -1109,7 +1364,7 @@ with tab1:
                         st.stop()
                 
                 for k, v in g2b_map.items():
-                    found = find_column(df_g2b, v)
+                    found = find_column(df_g2b, v, g2b_columns)
                     if found:
                         final_g2b_map[k] = found
                     else:
@@ -1119,7 +1374,8 @@ with tab1:
                 # Run reconciliation
                 cis_res, g2b_res, stats, audit = run_8_layer_reconciliation(
                     df_cis, df_g2b, final_cis_map, final_g2b_map,
-                    tol_std, tol_high, update_progress
+                    tol_std, tol_high, update_progress, 
+                    enable_fuzzy=enable_fuzzy, enable_reverse=enable_reverse
                 )
                 
                 # Store in session state
@@ -1128,6 +1384,15 @@ with tab1:
                 st.session_state.g2b_result = g2b_res
                 st.session_state.match_stats = stats
                 st.session_state.audit_log = audit
+                # Audit table (and its per-layer slices for tab3) built once per run
+                st.session_state.audit_df = pd.DataFrame(audit)
+                st.session_state.audit_by_layer = (
+                    dict(tuple(st.session_state.audit_df.groupby('layer', sort=False))) if audit else {}
+                )
+                # Unmatched records and their mismatch analysis for tab2, also once per run
+                unmatched_df = cis_res[cis_res['Matching Status'] == 'Unmatched']
+                st.session_state.unmatched_df = unmatched_df
+                st.session_state.mismatch_analysis = analyze_mismatches(unmatched_df, final_cis_map)
                 
                 progress_bar.empty()
                 status_text.empty()
@@ -1138,7 +1403,7 @@ with tab1:
                            unsafe_allow_html=True)
                 
                 # Quick stats
-                matched_count = len(cis_res[cis_res['Matching Status'] == 'Matched'])
+                matched_count = int(cis_res['Matching Status'].value_counts().get('Matched', 0))
                 total_count = len(cis_res)
                 match_pct = (matched_count / total_count * 100) if total_count > 0 else 0
                 
@@ -1155,113 +1420,9 @@ with tab1:
                 
                 # Layer statistics
                 st.subheader("Layer-wise Match Summary")
-                stats_df = pd.DataFrame(list(stats.items()), columns=['Layer', 'Matches'])
+                stats_df = pd.DataFrame({'Layer': list(stats), 'Matches': list(stats.values())})
                 st.dataframe(stats_df, use_container_width=True)
                 
-                # Display results
-                st.subheader("Reconciled CIS Data")
-                
-                display_df = cis_res.copy()
-                total_records = len(display_df)
-                total_cells = total_records * len(display_df.columns)
-                
-                # Show summary first
-                if total_records > 1000:
-                    st.warning(f"⚠️ Large dataset: {total_records:,} records detected. Use filters below to view specific records, or download the complete results.")
-                
-                # Add filter options for large datasets
-                if total_records > 1000:
-                    with st.expander("🔍 Filter Options (Optional)", expanded=False):
-                        col_f1, col_f2 = st.columns(2)
-                        with col_f1:
-                            status_filter = st.multiselect(
-                                "Filter by Status",
-                                options=['Matched', 'Unmatched'],
-                                default=['Matched', 'Unmatched']
-                            )
-                        with col_f2:
-                            show_limit = st.number_input(
-                                "Show first N records",
-                                min_value=100,
-                                max_value=total_records,
-                                value=min(1000, total_records),
-                                step=100,
-                                help="Limit display for better performance"
-                            )
-                        
-                        if status_filter:
-                            display_df = display_df[display_df['Matching Status'].isin(status_filter)]
-                        display_df = display_df.head(int(show_limit))
-                        
-                        st.info(f"📊 Showing {len(display_df):,} of {total_records:,} records (Full results available in download)")
-                
-                # Set pandas styling limit
-                pd.set_option("styler.render.max_elements", 1000000)
-                
-                # Apply styling conditionally based on dataset size
-                display_cells = len(display_df) * len(display_df.columns)
-                
-                if display_cells < 100000:  # Style smaller datasets
-                    st.dataframe(
-                        display_df.style.apply(highlight_status, axis=1),
-                        use_container_width=True,
-                        height=400
-                    )
-                else:  # For large datasets, show without styling
-                    st.info(f"ℹ️ Displaying {len(display_df):,} records without color coding for better performance")
-                    st.dataframe(
-                        display_df,
-                        use_container_width=True,
-                        height=400
-                    )
-                
-                # Download section
-                st.markdown("---")
-                st.subheader("📥 Download Results")
-                
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    # Excel download
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                        cis_res.to_excel(writer, sheet_name='CIS_Reconciled', index=False)
-                        g2b_res.to_excel(writer, sheet_name='GSTR2B_Mapped', index=False)
-                        stats_df.to_excel(writer, sheet_name='Statistics', index=False)
-                        if show_audit_log and audit:
-                            pd.DataFrame(audit).to_excel(writer, sheet_name='Audit_Log', index=False)
-                    
-                    st.download_button(
-                        "📊 Download Excel",
-                        output.getvalue(),
-                        f"GST_Reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    # CSV download
-                    csv_output = cis_res.to_csv(index=False)
-                    st.download_button(
-                        "📄 Download CSV",
-                        csv_output,
-                        f"CIS_Reconciled_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                
-                with col3:
-                    # JSON download (for audit)
-                    if show_audit_log and audit:
-                        json_output = json.dumps(audit, indent=2)
-                        st.download_button(
-                            "📋 Download Audit Log",
-                            json_output,
-                            f"Audit_Log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json",
-                            use_container_width=True
-                        )
-                
             except Exception as e:
                 progress_bar.empty()
                 status_text.empty()
@@ -1270,6 +1431,113 @@ with tab1:
     
     else:
         st.info("👆 Please upload both CIS and GSTR-2B files to begin reconciliation")
+    
+    # Results table and downloads: outside the run handler so they stay
+    # available (and the filters usable) on later reruns; the cached
+    # builders serialize each result only once
+    if st.session_state.reconciliation_done:
+        cis_res = st.session_state.cis_result
+        g2b_res = st.session_state.g2b_result
+        stats = st.session_state.match_stats
+        audit = st.session_state.audit_log
+        
+        # Display results
+        st.subheader("Reconciled CIS Data")
+        
+        display_df = cis_res  # filtered/sliced below, never modified in place
+        total_records = len(display_df)
+        total_cells = total_records * len(display_df.columns)
+        
+        # Show summary first
+        if total_records > 1000:
+            st.warning(f"⚠️ Large dataset: {total_records:,} records detected. Use filters below to view specific records, or download the complete results.")
+        
+        # Add filter options for large datasets
+        if total_records > 1000:
+            with st.expander("🔍 Filter Options (Optional)", expanded=False):
+                col_f1, col_f2 = st.columns(2)
+                with col_f1:
+                    status_filter = st.multiselect(
+                        "Filter by Status",
+                        options=['Matched', 'Unmatched'],
+                        default=['Matched', 'Unmatched']
+                    )
+                with col_f2:
+                    show_limit = st.number_input(
+                        "Show first N records",
+                        min_value=100,
+                        max_value=total_records,
+                        value=min(1000, total_records),
+                        step=100,
+                        help="Limit display for better performance"
+                    )
+                
+                if status_filter:
+                    display_df = display_df[display_df['Matching Status'].isin(status_filter)]
+                display_df = display_df.head(int(show_limit))
+                
+                st.info(f"📊 Showing {len(display_df):,} of {total_records:,} records (Full results available in download)")
+        
+        # Set pandas styling limit
+        pd.set_option("styler.render.max_elements", 1000000)
+        
+        # Styled frames are sent to the browser with per-cell styles, so only the
+        # first STYLED_ROW_LIMIT rows are color coded; "show all" sends the plain frame
+        show_all = len(display_df) > STYLED_ROW_LIMIT and st.checkbox(
+            f"Show all {len(display_df):,} records (without color coding)"
+        )
+        
+        if show_all:
+            st.dataframe(
+                display_df,
+                use_container_width=True,
+                height=400
+            )
+        else:
+            if len(display_df) > STYLED_ROW_LIMIT:
+                st.info(f"ℹ️ Showing the first {STYLED_ROW_LIMIT:,} of {len(display_df):,} records with color coding")
+            st.dataframe(
+                display_df.head(STYLED_ROW_LIMIT).style.apply(highlight_status, axis=None),
+                use_container_width=True,
+                height=400
+            )
+        
+        st.markdown("---")
+        st.subheader("📥 Download Results")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            # Excel download
+            stats_df = pd.DataFrame({'Layer': list(stats), 'Matches': list(stats.values())})
+            st.download_button(
+                "📊 Download Excel",
+                build_excel(cis_res, g2b_res, stats_df, audit if show_audit_log else []),
+                f"GST_Reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
+        
+        with col2:
+            # CSV download
+            st.download_button(
+                "📄 Download CSV",
+                build_csv(cis_res),
+                f"CIS_Reconciled_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        
+        with col3:
+            # JSON download (for audit)
+            if show_audit_log and audit:
+                st.download_button(
+                    "📋 Download Audit Log",
+                    build_json(audit),
+                    f"Audit_Log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json",
+                    use_container_width=True
+                )
 
 # ==========================================
 # TAB 2: ANALYTICS
@@ -1283,8 +1551,9 @@ with tab2:
         
         # Overall metrics
         st.markdown("### Key Metrics")
-        matched_count = len(cis_res[cis_res['Matching Status'] == 'Matched'])
-        unmatched_count = len(cis_res[cis_res['Matching Status'] == 'Unmatched'])
+        status_counts = cis_res['Matching Status'].value_counts()
+        matched_count = int(status_counts.get('Matched', 0))
+        unmatched_count = int(status_counts.get('Unmatched', 0))
         total_count = len(cis_res)
         match_pct = (matched_count / total_count * 100) if total_count > 0 else 0
         
@@ -1313,17 +1582,10 @@ with tab2:
         st.markdown("---")
         st.subheader("🔍 Mismatch Analysis")
         
-        unmatched_df = cis_res[cis_res['Matching Status'] == 'Unmatched']
+        unmatched_df = st.session_state.unmatched_df
         
         if len(unmatched_df) > 0:
-            # Get column map (approximate)
-            col_map_approx = {
-                'GSTIN': 'SupplierGSTIN',
-                'INVOICE': 'DocumentNumber',
-                'DATE': 'DocumentDate'
-            }
-            
-            analysis = analyze_mismatches(unmatched_df, col_map_approx)
+            analysis = st.session_state.mismatch_analysis
             
             col1, col2, col3 = st.columns(3)
             
@@ -1343,36 +1605,44 @@ with tab2:
 # ==========================================
 # TAB 3: AUDIT TRAIL
 # ==========================================
-with tab3:
-    if st.session_state.reconciliation_done and show_audit_log:
-        st.subheader("📋 Audit Trail")
+@fragment
+def audit_panel():
+    """Audit trail tab body; as a fragment, the layer filter reruns only this panel"""
+    st.subheader("📋 Audit Trail")
+    
+    if st.session_state.audit_log:
+        audit_df = st.session_state.audit_df
+        audit_by_layer = st.session_state.audit_by_layer
         
-        if st.session_state.audit_log:
-            audit_df = pd.DataFrame(st.session_state.audit_log)
-            
-            st.markdown(f"**Total Audit Entries:** {len(audit_df)}")
-            
-            # Filter by layer
-            layers = audit_df['layer'].unique().tolist()
-            selected_layer = st.selectbox("Filter by Layer", ['All'] + layers)
-            
-            if selected_layer != 'All':
-                display_audit = audit_df[audit_df['layer'] == selected_layer]
-            else:
-                display_audit = audit_df
-            
-            st.dataframe(display_audit, use_container_width=True, height=500)
-            
-            # Download audit log
-            csv_audit = display_audit.to_csv(index=False)
-            st.download_button(
-                "📥 Download Audit Trail",
-                csv_audit,
-                f"Audit_Trail_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+        st.markdown(f"**Total Audit Entries:** {len(audit_df)}")
+        
+        # Filter by layer
+        layers = list(audit_by_layer)
+        selected_layer = st.selectbox("Filter by Layer", ['All'] + layers)
+        
+        if selected_layer != 'All':
+            display_audit = audit_by_layer[selected_layer]
         else:
-            st.info("No audit entries generated")
+            display_audit = audit_df
+        
+        if len(display_audit) > AUDIT_DISPLAY_LIMIT:
+            st.info(f"ℹ️ Showing the first {AUDIT_DISPLAY_LIMIT:,} of {len(display_audit):,} entries (the download below has all of them)")
+        st.dataframe(display_audit.head(AUDIT_DISPLAY_LIMIT), use_container_width=True, height=500)
+        
+        # Download audit log
+        csv_audit = display_audit.to_csv(index=False)
+        st.download_button(
+            "📥 Download Audit Trail",
+            csv_audit,
+            f"Audit_Trail_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+    else:
+        st.info("No audit entries generated")
+
+with tab3:
+    if st.session_state.reconciliation_done and show_audit_log:
+        audit_panel()
     else:
         st.info("Enable 'Generate Audit Log' in settings and run reconciliation to view audit trail")
 